@@ -0,0 +1,187 @@
+import asyncio
+import json
+import logging
+import os
+import weakref
+from contextlib import asynccontextmanager, suppress
+
+import redis.asyncio as redis
+from fastapi import FastAPI, Request
+
+from logic.llm_processing_async_kafka.configs import settings
+from logic.llm_processing_async_kafka.history import (
+    HISTORY_UPDATES_CHANNEL,
+    conversation_key,
+    history_max_turns,
+    prompt_status_key,
+)
+from logic.llm_processing_async_kafka.publisher import Publisher
+
+logger = logging.getLogger(__name__)
+
+# Ingress settings
+REDIS_MAX_CONNECTIONS = int(os.getenv("ASYNC_LLM_REDIS_MAX_CONNECTIONS", "64"))
+# Re-read Redis at least this often while waiting, in case a notification was missed
+RESULT_RECHECK_SECONDS = float(os.getenv("ASYNC_LLM_RESULT_RECHECK_SECONDS", "5"))
+# How many of a conversation's newest turns are searched for a result
+RESULT_SCAN_TURNS = int(
+    os.getenv("ASYNC_LLM_RESULT_SCAN_TURNS", str(history_max_turns or 50))
+)
+
+
+class ConversationUpdates:
+    """
+    Wakes waiting requests when the consumer stores new turns for their conversation.
+
+    A single pub/sub connection per worker listens on HISTORY_UPDATES_CHANNEL
+    and sets a per-conversation asyncio.Event, so pending long-polls and
+    streams cost no Redis traffic until their conversation changes.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        # Events live only as long as some request is waiting on them
+        self._events = weakref.WeakValueDictionary()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._listen())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+
+    def event_for(self, conversation_id):
+        """
+        Event set by the next update of the conversation; take it before reading Redis
+        """
+        event = self._events.get(conversation_id)
+        if event is None:
+            event = asyncio.Event()
+            self._events[conversation_id] = event
+        return event
+
+    def notify(self, conversation_ids):
+        for conversation_id in conversation_ids:
+            event = self._events.pop(conversation_id, None)
+            if event is not None:
+                event.set()
+
+    async def _listen(self):
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(HISTORY_UPDATES_CHANNEL)
+                async for message in pubsub.listen():
+                    # One bad payload must not stop every later wake-up
+                    try:
+                        self.notify(json.loads(message["data"]))
+                    except Exception as e:
+                        logger.error(
+                            f"Ignoring malformed conversation update {message!r}: {e}"
+                        )
+            except Exception as e:
+                logger.error(f"Conversation update listener failed, reconnecting: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+
+async def find_results(client, conversation_id, message_ids):
+    """
+    Stored turns of the conversation answering any of message_ids, oldest first
+    """
+    raw_turns = await client.lrange(
+        conversation_key(conversation_id), 0, RESULT_SCAN_TURNS - 1
+    )
+    results = []
+    for raw_turn in reversed(raw_turns):
+        turn = json.loads(raw_turn)
+        if turn.get("message_id") in message_ids:
+            results.append(turn)
+    return results
+
+
+async def find_statuses(client, message_ids):
+    """
+    Statuses of prompts that have no answer yet ("retrying" or "failed"), by message id
+    """
+    message_ids = list(message_ids)
+    if not message_ids:
+        return {}
+    raw_statuses = await client.mget(
+        [prompt_status_key(message_id) for message_id in message_ids]
+    )
+    return {
+        message_id: json.loads(raw_status)
+        for message_id, raw_status in zip(message_ids, raw_statuses)
+        if raw_status is not None
+    }
+
+
+async def wait_for_results(client, updates, conversation_id, message_ids, timeout):
+    """
+    Yield each result as it lands in Redis, until all are found or the timeout passes.
+
+    A prompt that was dead-lettered is yielded as its failure status record
+    ({"message_id", "status": "failed", "error"}), since it will never be answered.
+    """
+    pending = set(message_ids)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while pending:
+        event = updates.event_for(conversation_id)
+        for turn in await find_results(client, conversation_id, pending):
+            # A re-delivered prompt can be answered twice; report it once
+            if turn["message_id"] in pending:
+                pending.discard(turn["message_id"])
+                yield turn
+        for message_id, status in (await find_statuses(client, pending)).items():
+            if status["status"] == "failed":
+                pending.discard(message_id)
+                yield status
+
+        remaining = deadline - loop.time()
+        if not pending or remaining <= 0:
+            return
+        with suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(event.wait(), min(remaining, RESULT_RECHECK_SECONDS))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One non-blocking producer and one bounded Redis pool shared by every request
+    app.state.prompt_publisher = Publisher(
+        settings.producer_config(client_id="async-llm-ingress")
+    )
+    app.state.results_redis = redis.Redis.from_pool(
+        redis.BlockingConnectionPool(
+            **settings.redis_config(), max_connections=REDIS_MAX_CONNECTIONS, timeout=10
+        )
+    )
+    app.state.conversation_updates = ConversationUpdates(app.state.results_redis)
+    app.state.conversation_updates.start()
+    try:
+        yield
+    finally:
+        await app.state.conversation_updates.close()
+        await app.state.results_redis.aclose()
+        # Delivers whatever is still buffered; blocks, so keep it off the event loop
+        await asyncio.to_thread(app.state.prompt_publisher.close, 10)
+
+
+def get_prompt_publisher(request: Request):
+    """
+    FastAPI dependency returning the app-scoped Kafka publisher
+    """
+    return request.app.state.prompt_publisher
+
+
+def get_results_redis(request: Request):
+    return request.app.state.results_redis
+
+
+def get_conversation_updates(request: Request):
+    return request.app.state.conversation_updates
@@ -0,0 +1,138 @@
+import json
+import os
+import uuid
+from contextlib import aclosing
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+from apps.async_llm.results import (
+    get_conversation_updates,
+    get_prompt_publisher,
+    get_results_redis,
+    find_statuses,
+    wait_for_results,
+)
+from apps.metrics.registry import REGISTRY
+from logic.llm_processing_async_kafka.configs import settings
+from logic.llm_processing_async_kafka.tracing import new_trace_headers
+
+router = APIRouter()
+
+MAX_PROMPTS_PER_REQUEST = int(os.getenv("ASYNC_LLM_MAX_PROMPTS_PER_REQUEST", "1000"))
+
+submitted_prompts = REGISTRY.counter(
+    "async_llm_prompts_total", "Prompts submitted over HTTP", ("result",)
+)
+
+
+class PromptIn(BaseModel):
+    prompt: str = Field(min_length=1)
+    # Omit to start a new conversation
+    conversation_id: Optional[str] = None
+
+
+class PromptBatch(BaseModel):
+    prompts: List[PromptIn] = Field(min_length=1, max_length=MAX_PROMPTS_PER_REQUEST)
+
+
+@router.post("/prompts", status_code=202)
+async def submit_prompts(batch: PromptBatch, publisher=Depends(get_prompt_publisher)):
+    """
+    Queue prompts for the Kafka consumers and return their ids without waiting for answers
+    """
+    accepted = []
+    for item in batch.prompts:
+        conversation_id = item.conversation_id or str(uuid.uuid4())
+        message_id = uuid.uuid4().hex
+        message = {
+            "conversation_id": conversation_id,
+            "prompt": item.prompt,
+            "message_id": message_id,
+        }
+        try:
+            # Only enqueues into librdkafka's buffer; never waits on the broker
+            publisher.publish(
+                topic=settings.kafka.prompt_topic,
+                key=conversation_id,
+                value=json.dumps(message),
+                headers=new_trace_headers(),
+                block=False,
+            )
+        except BufferError:
+            submitted_prompts.labels("rejected").inc(len(batch.prompts) - len(accepted))
+            # Tell the client which prompts made it so it only resends the rest
+            raise HTTPException(
+                status_code=503,
+                detail={"message": "Prompt queue is full", "accepted": accepted},
+                headers={"Retry-After": "1"},
+            )
+        accepted.append({"conversation_id": conversation_id, "message_id": message_id})
+
+    submitted_prompts.labels("accepted").inc(len(accepted))
+    return {"accepted": accepted}
+
+
+@router.get("/conversations/{conversation_id}/result")
+async def get_result(
+    conversation_id: str,
+    message_id: str,
+    timeout: float = Query(30, ge=0, le=60),
+    client=Depends(get_results_redis),
+    updates=Depends(get_conversation_updates),
+):
+    """
+    Long-poll for one prompt's answer, or its failure record if it was dead-lettered.
+
+    202 if it isn't ready within the timeout, with status "retrying" when the
+    prompt failed transiently and is waiting for a retry, else "pending".
+    """
+    results = wait_for_results(client, updates, conversation_id, [message_id], timeout)
+    async with aclosing(results):
+        async for turn in results:
+            return {"conversation_id": conversation_id, **turn}
+    status = (await find_statuses(client, [message_id])).get(message_id, {})
+    return JSONResponse(
+        status_code=202,
+        content={
+            "conversation_id": conversation_id,
+            "message_id": message_id,
+            "status": "pending",
+            **status,
+        },
+    )
+
+
+@router.get("/conversations/{conversation_id}/events")
+async def stream_results(
+    conversation_id: str,
+    message_id: List[str] = Query(...),
+    timeout: float = Query(300, ge=0, le=3600),
+    client=Depends(get_results_redis),
+    updates=Depends(get_conversation_updates),
+):
+    """
+    Server-Sent Events with each answer (or failure record) as it is stored, then a final [DONE] event
+    """
+
+    async def events():
+        pending = set(message_id)
+        results = wait_for_results(
+            client, updates, conversation_id, message_id, timeout
+        )
+        async with aclosing(results):
+            async for turn in results:
+                pending.discard(turn["message_id"])
+                yield f"data: {json.dumps({'conversation_id': conversation_id, **turn})}\n\n"
+        if pending:
+            yield f"data: {json.dumps({'pending': sorted(pending)})}\n\n"
+        yield "data: [DONE]\n\n"
+
+    # Keep proxies (nginx) from buffering events until the stream ends
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,97 @@
+"""
+Time-to-first-byte benchmark for /langchain_stream_router/stream_answer style streams.
+
+Starts the mock OpenAI server locally and compares building a new ChatOpenAI per
+request against the shared pooled client from llm_client.
+
+Usage:
+    python -m apps.langchain_stream.benchmark --concurrency 200
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import threading
+import time
+
+import httpx
+import uvicorn
+
+from apps.langchain_stream import llm_client
+from apps.langchain_stream.mock_openai import app as mock_app
+
+
+def start_mock_server(port):
+    config = uvicorn.Config(
+        mock_app, host="127.0.0.1", port=port, log_level="warning", backlog=4096
+    )
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def time_to_first_byte(get_llm, query):
+    start = time.perf_counter()
+    llm = get_llm()
+    ttfb = None
+    async for _ in llm.astream(query):
+        if ttfb is None:
+            ttfb = time.perf_counter() - start
+    return ttfb
+
+
+async def run_mode(name, get_llm, concurrency, rounds):
+    samples = []
+    for _ in range(rounds):
+        samples += await asyncio.gather(
+            *(time_to_first_byte(get_llm, f"query {i}") for i in range(concurrency))
+        )
+    print(
+        f"{name:<12} streams={len(samples):<6} "
+        f"p50={percentile(samples, 50) * 1000:8.2f}ms "
+        f"p99={percentile(samples, 99) * 1000:8.2f}ms "
+        f"mean={statistics.mean(samples) * 1000:8.2f}ms"
+    )
+
+
+async def main(concurrency, rounds, base_url):
+    overrides = {"base_url": base_url, "api_key": "mock-key"}
+
+    # Baseline: what the handler used to do, one client (and connection) per request
+    await run_mode(
+        "per_request",
+        lambda: llm_client.create_llm(**overrides),
+        concurrency,
+        rounds,
+    )
+
+    # Pooled: one app-scoped client, as created by llm_client.lifespan
+    http_async_client = httpx.AsyncClient(**llm_client._pool_kwargs())
+    shared_llm = llm_client.create_llm(http_async_client=http_async_client, **overrides)
+    await run_mode("pooled", lambda: shared_llm, concurrency, rounds)
+    await http_async_client.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8001)
+    args = parser.parse_args()
+
+    base_url = os.getenv("OPENAI_BASE_URL")
+    if not base_url:
+        start_mock_server(args.port)
+        base_url = f"http://127.0.0.1:{args.port}/v1"
+
+    asyncio.run(main(args.concurrency, args.rounds, base_url))
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import logging
+import os
+import re
+from collections import OrderedDict
+from contextlib import aclosing, asynccontextmanager
+
+import redis.asyncio as redis
+from fastapi import FastAPI, Request
+
+logger = logging.getLogger(__name__)
+
+# Cache settings. Off by default: answers are sampled (LANGCHAIN_STREAM_TEMPERATURE),
+# so a cached answer is only a faithful replay with temperature 0
+CACHE_ENABLED = os.getenv("LANGCHAIN_STREAM_CACHE", "0") == "1"
+CACHE_MAX_ENTRIES = int(os.getenv("LANGCHAIN_STREAM_CACHE_MAX_ENTRIES", "10000"))
+CACHE_TTL_SECONDS = int(os.getenv("LANGCHAIN_STREAM_CACHE_TTL", "3600"))
+CACHE_REDIS_ENABLED = os.getenv("LANGCHAIN_STREAM_CACHE_REDIS", "0") == "1"
+
+# Redis configuration based on your Docker settings
+redis_config = {
+    "host": os.getenv("REDIS_HOST", "localhost"),
+    "port": int(os.getenv("REDIS_PORT", "6379")),
+    "password": os.getenv("REDIS_PASSWORD"),
+    "db": 0,
+    "decode_responses": True,  # Automatically decode response bytes to strings
+}
+
+_whitespace = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    # Only collapse whitespace: case can change what is being asked
+    return _whitespace.sub(" ", query).strip()
+
+
+def make_cache_key(query: str, model: str, temperature) -> str:
+    raw = f"{model}|{temperature}|{normalize_query(query)}"
+    return "llm_cache:" + hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    """
+    In-process tier: bounded LRU of chunk lists, no I/O on the hot path
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    async def get(self, key):
+        chunks = self._entries.get(key)
+        if chunks is not None:
+            self._entries.move_to_end(key)
+        return chunks
+
+    async def set(self, key, chunks):
+        self._entries[key] = chunks
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def close(self):
+        self._entries.clear()
+
+
+class RedisCache:
+    """
+    Shared tier: chunk lists stored as JSON with a TTL, visible to every worker
+    """
+
+    def __init__(self, client, ttl=CACHE_TTL_SECONDS):
+        self.client = client
+        self.ttl = ttl
+
+    async def get(self, key):
+        try:
+            value = await self.client.get(key)
+        except redis.RedisError as e:
+            logger.error(f"Redis cache read failed: {e}")
+            return None
+        return tuple(json.loads(value)) if value is not None else None
+
+    async def set(self, key, chunks):
+        try:
+            await self.client.set(key, json.dumps(list(chunks)), ex=self.ttl)
+        except redis.RedisError as e:
+            logger.error(f"Redis cache write failed: {e}")
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class TieredCache:
+    """
+    Look up tiers in order; a hit in a slower tier is promoted to the faster ones
+    """
+
+    def __init__(self, *tiers):
+        self.tiers = tiers
+
+    async def get(self, key):
+        for index, tier in enumerate(self.tiers):
+            chunks = await tier.get(key)
+            if chunks is not None:
+                for faster in self.tiers[:index]:
+                    await faster.set(key, chunks)
+                return chunks
+        return None
+
+    async def set(self, key, chunks):
+        for tier in self.tiers:
+            await tier.set(key, chunks)
+
+    async def close(self):
+        for tier in self.tiers:
+            await tier.close()
+
+
+def create_response_cache():
+    tiers = [LRUCache()]
+    if CACHE_REDIS_ENABLED:
+        tiers.append(RedisCache(redis.Redis(**redis_config)))
+    return TieredCache(*tiers)
+
+
+async def replay_chunks(chunks):
+    """
+    Stream cached chunks back with their original boundaries
+    """
+    for chunk in chunks:
+        yield chunk
+
+
+async def record_chunks(cache, key, chunks):
+    """
+    Pass chunks through and store them once the stream completes.
+
+    Streams that are cancelled, fail part-way or produce no text are never cached.
+    """
+    recorded = []
+    async with aclosing(chunks):
+        async for chunk in chunks:
+            recorded.append(chunk)
+            yield chunk
+    if recorded:
+        await cache.set(key, tuple(recorded))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.response_cache = create_response_cache() if CACHE_ENABLED else None
+    try:
+        yield
+    finally:
+        if app.state.response_cache is not None:
+            await app.state.response_cache.close()
+
+
+def get_response_cache(request: Request):
+    """
+    FastAPI dependency returning the app-scoped response cache, or None if disabled
+    """
+    return request.app.state.response_cache
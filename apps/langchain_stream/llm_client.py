@@ -0,0 +1,87 @@
+import importlib.util
+import os
+from contextlib import asynccontextmanager
+
+import httpx
+from dotenv import load_dotenv
+from fastapi import FastAPI, Request
+from langchain_openai import ChatOpenAI
+
+load_dotenv()
+
+# LLM settings
+LLM_MODEL = os.getenv("LANGCHAIN_STREAM_MODEL", "gpt-4o-mini")
+LLM_TEMPERATURE = float(os.getenv("LANGCHAIN_STREAM_TEMPERATURE", "0.7"))
+# Point this at a local mock server for benchmarking (e.g. http://127.0.0.1:8001/v1)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
+
+# Connection pool settings, shared by every request served by this worker
+POOL_MAX_CONNECTIONS = int(os.getenv("LANGCHAIN_STREAM_POOL_MAX_CONNECTIONS", "200"))
+POOL_MAX_KEEPALIVE = int(os.getenv("LANGCHAIN_STREAM_POOL_MAX_KEEPALIVE", "50"))
+POOL_KEEPALIVE_EXPIRY = float(os.getenv("LANGCHAIN_STREAM_POOL_KEEPALIVE_EXPIRY", "60"))
+CONNECT_TIMEOUT = float(os.getenv("LANGCHAIN_STREAM_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("LANGCHAIN_STREAM_READ_TIMEOUT", "60"))
+POOL_TIMEOUT = float(os.getenv("LANGCHAIN_STREAM_POOL_TIMEOUT", "10"))
+MAX_RETRIES = int(os.getenv("LANGCHAIN_STREAM_MAX_RETRIES", "2"))
+
+# HTTP/2 multiplexes many streams over one TLS connection; needs h2 (in requirements.txt),
+# without it the pool falls back to HTTP/1.1
+HTTP2_ENABLED = (
+    os.getenv("LANGCHAIN_STREAM_HTTP2", "1") == "1"
+    and importlib.util.find_spec("h2") is not None
+)
+
+
+def _pool_kwargs():
+    return {
+        "http2": HTTP2_ENABLED,
+        "limits": httpx.Limits(
+            max_connections=POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=POOL_MAX_KEEPALIVE,
+            keepalive_expiry=POOL_KEEPALIVE_EXPIRY,
+        ),
+        "timeout": httpx.Timeout(
+            connect=CONNECT_TIMEOUT,
+            read=READ_TIMEOUT,
+            write=CONNECT_TIMEOUT,
+            pool=POOL_TIMEOUT,
+        ),
+    }
+
+
+def create_llm(http_client=None, http_async_client=None, **overrides):
+    """
+    Build a streaming ChatOpenAI bound to the given (pooled) HTTP clients
+    """
+    params = {
+        "model": LLM_MODEL,
+        "temperature": LLM_TEMPERATURE,
+        "streaming": True,
+        "max_retries": MAX_RETRIES,
+        "http_client": http_client,
+        "http_async_client": http_async_client,
+    }
+    if OPENAI_BASE_URL:
+        params["base_url"] = OPENAI_BASE_URL
+    params.update(overrides)
+    return ChatOpenAI(**params)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Create one pooled LLM client per worker and close its connections on shutdown
+    """
+    http_async_client = httpx.AsyncClient(**_pool_kwargs())
+    app.state.langchain_llm = create_llm(http_async_client=http_async_client)
+    try:
+        yield
+    finally:
+        await http_async_client.aclose()
+
+
+def get_llm(request: Request) -> ChatOpenAI:
+    """
+    FastAPI dependency returning the app-scoped LLM client
+    """
+    return request.app.state.langchain_llm
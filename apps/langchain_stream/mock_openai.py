@@ -0,0 +1,74 @@
+"""
+Minimal OpenAI-compatible chat completions server used for local benchmarks.
+
+Run it standalone with:
+    uvicorn apps.langchain_stream.mock_openai:app --port 8001
+and point the app at it with OPENAI_BASE_URL=http://127.0.0.1:8001/v1
+"""
+
+import asyncio
+import json
+import os
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Simulated upstream latency
+FIRST_TOKEN_DELAY = float(os.getenv("MOCK_OPENAI_FIRST_TOKEN_DELAY", "0.05"))
+INTER_TOKEN_DELAY = float(os.getenv("MOCK_OPENAI_INTER_TOKEN_DELAY", "0.005"))
+NUM_TOKENS = int(os.getenv("MOCK_OPENAI_NUM_TOKENS", "50"))
+
+app = FastAPI()
+
+
+def _chunk(model, content=None, finish_reason=None):
+    delta = {"content": content} if content is not None else {}
+    return {
+        "id": "chatcmpl-mock",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+async def _stream_tokens(model):
+    await asyncio.sleep(FIRST_TOKEN_DELAY)
+    for i in range(NUM_TOKENS):
+        yield f"data: {json.dumps(_chunk(model, f'token{i} '))}\n\n"
+        await asyncio.sleep(INTER_TOKEN_DELAY)
+    yield f"data: {json.dumps(_chunk(model, finish_reason='stop'))}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "mock")
+
+    if body.get("stream"):
+        return StreamingResponse(_stream_tokens(model), media_type="text/event-stream")
+
+    await asyncio.sleep(FIRST_TOKEN_DELAY + INTER_TOKEN_DELAY * NUM_TOKENS)
+    content = "".join(f"token{i} " for i in range(NUM_TOKENS))
+    return JSONResponse(
+        {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": 1,
+                "completion_tokens": NUM_TOKENS,
+                "total_tokens": NUM_TOKENS + 1,
+            },
+        }
+    )
@@ -1,9 +1,11 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
 from fastapi.responses import StreamingResponse, Response
 
 
 from dotenv import load_dotenv
+import json
 import os
+from contextlib import aclosing
 import openai
 
 from langchain_openai import ChatOpenAI
@@ -11,39 +13,105 @@ from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel, Field
 import time
 
+from apps.langchain_stream.cache import (
+    get_response_cache,
+    make_cache_key,
+    record_chunks,
+    replay_chunks,
+)
+from apps.langchain_stream.llm_client import get_llm
+from apps.metrics.registry import REGISTRY, instrument_stream
+from logic.singleflight import StreamSingleFlight
+
 load_dotenv()
 openai.api_key = os.getenv("OPENAI_API_KEY")
 router = APIRouter()
 
+cache_requests = REGISTRY.counter(
+    "langchain_stream_cache_requests_total", "Response cache lookups", ("result",)
+)
+coalesced_requests = REGISTRY.counter(
+    "langchain_stream_coalesced_requests_total",
+    "Requests that joined an identical in-flight upstream stream",
+)
+stream_flights = StreamSingleFlight()
+
 
 @router.get("/health")
 async def health_check():
     return {"message": "I am healthy"}
 
 
-def stream_from_openai(llm, query: str):
-    llm = ChatOpenAI(model="gpt-4o-mini", streaming=True)
-    response = llm.stream(query)
-    for chunk in response:
-        yield chunk.content
+async def stream_from_openai(llm, query: str):
+    """
+    Yield answer chunks as they arrive without holding a threadpool worker.
+
+    The next chunk is only pulled from upstream once the previous one has been
+    consumed. Cancelling or closing this generator closes the upstream HTTP
+    response in the finally block.
+    """
+    response = llm.astream(query)
+    try:
+        async for chunk in response:
+            if chunk.content:
+                yield chunk.content
+    finally:
+        await response.aclose()
+
+
+def upstream_chunks(llm, query: str, cache, cache_key: str):
+    chunks = stream_from_openai(llm, query)
+    if cache is not None:
+        chunks = record_chunks(cache, cache_key, chunks)
+    return chunks
+
+
+async def sse_from_chunks(chunks):
+    """
+    Frame text chunks as Server-Sent Events, ending with a [DONE] event
+    """
+    async with aclosing(chunks):
+        async for chunk in chunks:
+            yield f"data: {json.dumps({'content': chunk})}\n\n"
+    yield "data: [DONE]\n\n"
 
 
 @router.get("/stream_answer")
-async def stream_answer(query: str):
+async def stream_answer(
+    query: str,
+    sse: bool = False,
+    llm: ChatOpenAI = Depends(get_llm),
+    cache=Depends(get_response_cache),
+):
     streaming = True
-    llm = ChatOpenAI(model="gpt-4o-mini", streaming=streaming)
 
-    start_time = time.time()
+    start_time = time.perf_counter()
 
-    if streaming:
+    # Serve repeated queries from the cache, replayed with the original chunk boundaries
+    cache_key = make_cache_key(query, llm.model_name, llm.temperature)
+    cached_chunks = await cache.get(cache_key) if cache is not None else None
+    if cached_chunks is not None:
+        chunks = replay_chunks(cached_chunks)
+    else:
+        # Identical queries already in flight share one upstream generation
+        chunks = stream_flights.stream(
+            cache_key,
+            lambda: upstream_chunks(llm, query, cache, cache_key),
+            on_join=coalesced_requests.inc,
+        )
+    if cache is not None:
+        cache_requests.labels("hit" if cached_chunks is not None else "miss").inc()
+    chunks = instrument_stream(chunks, "stream_answer", start_time)
+
+    if streaming and sse:
         response = StreamingResponse(
-            stream_from_openai(llm, query), media_type="text/plain"
+            sse_from_chunks(chunks),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
         )
+    elif streaming:
+        response = StreamingResponse(chunks, media_type="text/plain")
     else:
-        response = Response(llm.invoke(query).content, media_type="text/plain")
-
-    end_time = time.time()
-    duration = end_time - start_time
-    print(f"Response time: {duration} seconds")
+        response = Response((await llm.ainvoke(query)).content, media_type="text/plain")
 
     return response
@@ -0,0 +1,80 @@
+"""
+/metrics across several worker processes.
+
+The registry lives in each process, so with WEB_CONCURRENCY > 1 a scrape would
+only see whichever worker accepted it. When METRICS_MULTIPROC_DIR is set every
+worker writes a snapshot of its registry there (every METRICS_WRITE_INTERVAL
+seconds, on shutdown, and before answering a scrape) and /metrics renders the
+sum of all snapshots. Snapshots of exited workers are kept so counters never go
+backwards; empty the directory when the server starts.
+"""
+
+import asyncio
+import glob
+import json
+import logging
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+
+from apps.metrics.registry import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR")
+METRICS_WRITE_INTERVAL = float(os.getenv("METRICS_WRITE_INTERVAL", "1"))
+
+
+def write_snapshot(registry=REGISTRY, directory=METRICS_MULTIPROC_DIR):
+    path = os.path.join(directory, f"{os.getpid()}.json")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(registry.snapshot(), f)
+    # Atomic, so a scrape never reads a half-written snapshot
+    os.replace(tmp_path, path)
+
+
+def read_snapshots(directory=METRICS_MULTIPROC_DIR):
+    snapshots = []
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        try:
+            with open(path) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError) as e:
+            logger.error(f"Skipping metrics snapshot {path}: {e}")
+    return snapshots
+
+
+def render_metrics(registry=REGISTRY):
+    if not METRICS_MULTIPROC_DIR:
+        return registry.render()
+    write_snapshot(registry)
+    return registry.render(read_snapshots())
+
+
+async def write_snapshots_forever():
+    while True:
+        await asyncio.sleep(METRICS_WRITE_INTERVAL)
+        try:
+            await asyncio.to_thread(write_snapshot)
+        except OSError as e:
+            logger.error(f"Writing metrics snapshot failed: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if not METRICS_MULTIPROC_DIR:
+        yield
+        return
+    os.makedirs(METRICS_MULTIPROC_DIR, exist_ok=True)
+    writer = asyncio.create_task(write_snapshots_forever())
+    try:
+        yield
+    finally:
+        writer.cancel()
+        try:
+            await writer
+        except asyncio.CancelledError:
+            pass
+        write_snapshot()
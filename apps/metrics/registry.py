@@ -0,0 +1,305 @@
+"""
+Tiny in-process Prometheus-style metrics registry shared by every router.
+
+Updates are a dict lookup plus an integer/float add under an uncontended lock,
+so they are cheap enough to call once per streamed chunk.
+"""
+
+import abc
+import threading
+import time
+from bisect import bisect_left
+from contextlib import aclosing
+
+# Default latency buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+RATE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000)
+INF = float("inf")
+
+
+def _escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    body = ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in pairs)
+    return "{" + body + "}"
+
+
+def _format_value(value):
+    if value == INF:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(abc.ABC):
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *labelvalues):
+        child = self._children.get(labelvalues)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(labelvalues, self._new_child())
+        return child
+
+    @abc.abstractmethod
+    def _new_child(self):
+        """
+        A fresh per-labelset child holding the metric's value
+        """
+
+    @abc.abstractmethod
+    def _merge(self, value, other):
+        """
+        Combine the values of one labelset from two processes
+        """
+
+    @abc.abstractmethod
+    def _render_value(self, labelvalues, value):
+        """
+        Exposition lines for one labelset's value
+        """
+
+    def values(self):
+        """
+        Current value of every child, by label values
+        """
+        return {
+            labelvalues: child.value()
+            for labelvalues, child in list(self._children.items())
+        }
+
+    def render(self, values=None):
+        if values is None:
+            values = self.values()
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        for labelvalues, value in values.items():
+            lines.extend(self._render_value(labelvalues, value))
+        return lines
+
+
+class _CounterChild:
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def value(self):
+        return self._value
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def _merge(self, value, other):
+        return value + other
+
+    def _render_value(self, labelvalues, value):
+        labels = _format_labels(self.labelnames, labelvalues)
+        return [f"{self.name}{labels} {_format_value(value)}"]
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self._upper_bounds = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self._upper_bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def value(self):
+        """
+        (per-bucket counts, sum)
+        """
+        with self._lock:
+            return list(self._counts), self._sum
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(float(b) for b in buckets)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def _merge(self, value, other):
+        counts, total = value
+        other_counts, other_total = other
+        return [a + b for a, b in zip(counts, other_counts)], total + other_total
+
+    def _render_value(self, labelvalues, value):
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for upper_bound, count in zip(self.buckets + (INF,), counts):
+            cumulative += count
+            labels = _format_labels(
+                self.labelnames, labelvalues, ("le", _format_value(upper_bound))
+            )
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, labelvalues)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def snapshot(self):
+        """
+        Every metric's values in a JSON-serializable form, to merge across processes
+        """
+        return {
+            name: [
+                [list(labelvalues), value]
+                for labelvalues, value in metric.values().items()
+            ]
+            for name, metric in list(self._metrics.items())
+        }
+
+    def render(self, snapshots=None):
+        """
+        Prometheus text format. Given snapshots (see snapshot()) from several
+        processes, renders their sum instead of this process's values.
+        """
+        lines = []
+        for metric in list(self._metrics.values()):
+            if snapshots is None:
+                lines.extend(metric.render())
+                continue
+            merged = {}
+            for snapshot in snapshots:
+                for labelvalues, value in snapshot.get(metric.name, ()):
+                    labelvalues = tuple(labelvalues)
+                    if labelvalues in merged:
+                        value = metric._merge(merged[labelvalues], value)
+                    merged[labelvalues] = value
+            lines.extend(metric.render(merged))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Streaming metrics, labelled by endpoint so every router can share them
+stream_requests = REGISTRY.counter(
+    "llm_stream_requests_total", "Streaming requests started", ("endpoint",)
+)
+stream_errors = REGISTRY.counter(
+    "llm_stream_errors_total",
+    "Streams that ended with an error or disconnect",
+    ("endpoint",),
+)
+stream_tokens = REGISTRY.counter(
+    "llm_stream_tokens_total", "Chunks (approximately tokens) streamed", ("endpoint",)
+)
+time_to_first_token = REGISTRY.histogram(
+    "llm_stream_time_to_first_token_seconds",
+    "Time from request start to the first streamed chunk",
+    ("endpoint",),
+)
+inter_token_gap = REGISTRY.histogram(
+    "llm_stream_inter_token_gap_seconds",
+    "Gap between consecutive streamed chunks",
+    ("endpoint",),
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+stream_duration = REGISTRY.histogram(
+    "llm_stream_duration_seconds", "Total stream duration", ("endpoint",)
+)
+tokens_per_second = REGISTRY.histogram(
+    "llm_stream_tokens_per_second",
+    "Per-stream generation rate after the first chunk",
+    ("endpoint",),
+    buckets=RATE_BUCKETS,
+)
+
+
+async def instrument_stream(chunks, endpoint, start_time=None):
+    """
+    Wrap an async chunk iterator and record TTFT, inter-chunk gaps and throughput.
+
+    start_time should come from time.perf_counter() at request arrival so TTFT
+    includes any work done before the first chunk.
+    """
+    if start_time is None:
+        start_time = time.perf_counter()
+    ttft = time_to_first_token.labels(endpoint)
+    gap = inter_token_gap.labels(endpoint)
+    stream_requests.labels(endpoint).inc()
+
+    first_at = None
+    last_at = None
+    count = 0
+    completed = False
+    try:
+        async with aclosing(chunks):
+            async for chunk in chunks:
+                now = time.perf_counter()
+                if first_at is None:
+                    first_at = now
+                    ttft.observe(now - start_time)
+                else:
+                    gap.observe(now - last_at)
+                last_at = now
+                count += 1
+                yield chunk
+        completed = True
+    finally:
+        end = time.perf_counter()
+        stream_duration.labels(endpoint).observe(end - start_time)
+        stream_tokens.labels(endpoint).inc(count)
+        if count > 1 and last_at > first_at:
+            tokens_per_second.labels(endpoint).observe(
+                (count - 1) / (last_at - first_at)
+            )
+        if not completed:
+            stream_errors.labels(endpoint).inc()
@@ -0,0 +1,146 @@
+"""
+How long the assistant keeps talking after the caller interrupts it.
+
+The mock realtime server speaks one long response, generated faster than
+real time, and signals input_audio_buffer.speech_started partway through.
+Each simulated call plays its audio like Twilio does (buffered, 20ms per
+frame, marks echoed once played, buffer flushed on "clear") and reports the
+time from speech_started to the last frame the caller hears, with barge-in
+handling off and on.
+
+Usage:
+    python -m apps.twilio_restaurants.benchmark_barge_in --calls 3
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from collections import deque
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark-key")
+
+from websockets.asyncio.client import connect  # noqa: E402
+
+from apps.twilio_restaurants import mock_realtime, routes, sessions  # noqa: E402
+from apps.twilio_restaurants.load_test import (  # noqa: E402
+    FRAME_INTERVAL,
+    percentile,
+    send_audio,
+    start_app_server,
+    start_mock_realtime,
+)
+
+
+async def play(websocket, stream_sid, buffer, played):
+    """
+    Twilio's side of playback: one frame per 20ms, echoing marks as reached
+    """
+    while True:
+        while buffer and buffer[0] is None:
+            buffer.popleft()
+            await websocket.send(
+                json.dumps(
+                    {"event": "mark", "streamSid": stream_sid, "mark": {"name": ""}}
+                )
+            )
+        if buffer:
+            buffer.popleft()
+            played.append(time.perf_counter())
+        await asyncio.sleep(FRAME_INTERVAL)
+
+
+async def interrupted_call(url, stats, call_seconds):
+    """
+    Seconds from the caller starting to talk until the assistant goes quiet
+    """
+    stream_sid = f"MZ{uuid.uuid4().hex}"
+    # Queued media frames, with None for marks
+    buffer = deque()
+    played = []
+    cleared_at = 0
+    barge_ins = len(stats.speech_started_at)
+    async with connect(url, max_queue=None) as websocket:
+        await websocket.send(
+            json.dumps({"event": "start", "start": {"streamSid": stream_sid}})
+        )
+        tasks = [
+            asyncio.create_task(send_audio(websocket, stream_sid)),
+            asyncio.create_task(play(websocket, stream_sid, buffer, played)),
+        ]
+        end_time = time.perf_counter() + call_seconds
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(
+                        websocket.recv(), end_time - time.perf_counter()
+                    )
+                except asyncio.TimeoutError:
+                    break
+                event = json.loads(message)["event"]
+                if event == "media":
+                    buffer.append(time.perf_counter())
+                elif event == "mark":
+                    buffer.append(None)
+                elif event == "clear":
+                    # Twilio drops the queued audio and echoes the pending marks
+                    cleared_at = time.perf_counter()
+                    for item in buffer:
+                        if item is None:
+                            await websocket.send(
+                                json.dumps(
+                                    {
+                                        "event": "mark",
+                                        "streamSid": stream_sid,
+                                        "mark": {"name": ""},
+                                    }
+                                )
+                            )
+                    buffer.clear()
+        finally:
+            for task in tasks:
+                task.cancel()
+    return max(played[-1], cleared_at) - stats.speech_started_at[barge_ins]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=3)
+    parser.add_argument("--response-seconds", type=float, default=10)
+    parser.add_argument("--response-speed", type=float, default=5)
+    parser.add_argument("--barge-in-after", type=float, default=1.5)
+    parser.add_argument("--realtime-port", type=int, default=8017)
+    parser.add_argument("--app-port", type=int, default=8018)
+    args = parser.parse_args()
+
+    mock_realtime.RESPONSE_SECONDS = args.response_seconds
+    mock_realtime.RESPONSE_SPEED = args.response_speed
+    mock_realtime.BARGE_IN_AFTER = args.barge_in_after
+    stats = mock_realtime.MockStats()
+    start_mock_realtime(args.realtime_port, stats)
+    sessions.OPENAI_REALTIME_URL = f"ws://127.0.0.1:{args.realtime_port}"
+    start_app_server(args.app_port)
+    url = f"ws://127.0.0.1:{args.app_port}/twilio_restaurants/media-stream"
+    call_seconds = args.response_seconds + 2
+
+    for name, barge_in in (("off", False), ("on", True)):
+        routes.BARGE_IN = barge_in
+        truncations = len(stats.truncations)
+        cancels = stats.cancels
+        latencies = [
+            asyncio.run(interrupted_call(url, stats, call_seconds))
+            for _ in range(args.calls)
+        ]
+        print(
+            f"barge-in {name:3}: caller keeps hearing the assistant for "
+            f"p50 {percentile(latencies, 50) * 1e3:.0f}ms, "
+            f"max {max(latencies) * 1e3:.0f}ms after talking over it; "
+            f"{stats.cancels - cancels} responses cancelled, "
+            f"truncated at {stats.truncations[truncations:]}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
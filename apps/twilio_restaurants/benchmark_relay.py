@@ -0,0 +1,141 @@
+"""
+Per-call CPU microbenchmark for the media-stream audio relay.
+
+Replays 20ms G.711 frames through the previous relay code (json + base64
+round trip) and through the relay fast path, and reports CPU per frame, CPU
+per call-second (50 frames each way) and how many concurrent calls one core
+could relay. Only the relay's own processing is measured; websocket framing
+and socket I/O are not included.
+
+Usage:
+    python -m apps.twilio_restaurants.benchmark_relay --frames 200000
+"""
+
+import argparse
+import base64
+import json
+import os
+import time
+
+from apps.twilio_restaurants.relay import MediaFrames, audio_append_event, loads
+
+FRAMES_PER_SECOND = 50  # 20ms frames
+FRAME_BYTES = 160  # 20ms of 8kHz u-law
+STREAM_SID = "MZ" + "0" * 32
+
+
+def twilio_media_message(sequence):
+    return json.dumps(
+        {
+            "event": "media",
+            "sequenceNumber": str(sequence),
+            "media": {
+                "track": "inbound",
+                "chunk": str(sequence),
+                "timestamp": str(sequence * 20),
+                "payload": base64.b64encode(os.urandom(FRAME_BYTES)).decode(),
+            },
+            "streamSid": STREAM_SID,
+        }
+    )
+
+
+def openai_delta_message(sequence):
+    return json.dumps(
+        {
+            "type": "response.audio.delta",
+            "event_id": f"event_{sequence:020d}",
+            "response_id": "resp_" + "0" * 20,
+            "item_id": "item_" + "0" * 20,
+            "output_index": 0,
+            "content_index": 0,
+            "delta": base64.b64encode(os.urandom(FRAME_BYTES)).decode(),
+        }
+    )
+
+
+def legacy_inbound(message):
+    data = json.loads(message)
+    if data["event"] == "media":
+        return json.dumps(
+            {"type": "input_audio_buffer.append", "audio": data["media"]["payload"]}
+        )
+
+
+def legacy_outbound(message, stream_sid):
+    response = json.loads(message)
+    if response["type"] == "response.audio.delta" and response.get("delta"):
+        audio_payload = base64.b64encode(base64.b64decode(response["delta"])).decode(
+            "utf-8"
+        )
+        audio_delta = {
+            "event": "media",
+            "streamSid": stream_sid,
+            "media": {"payload": audio_payload},
+        }
+        # What starlette's send_json does
+        return json.dumps(audio_delta, separators=(",", ":"), ensure_ascii=False)
+
+
+def fast_inbound(message):
+    data = loads(message)
+    if data["event"] == "media":
+        return audio_append_event(data["media"]["payload"])
+
+
+def make_fast_outbound():
+    media_frames = MediaFrames(STREAM_SID)
+
+    def fast_outbound(message, stream_sid):
+        response = loads(message)
+        if response["type"] == "response.audio.delta" and response.get("delta"):
+            return media_frames.media(response["delta"])
+
+    return fast_outbound
+
+
+def cpu_per_frame(fn, messages, *args):
+    start_time = time.process_time()
+    for message in messages:
+        fn(message, *args)
+    return (time.process_time() - start_time) / len(messages)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=200000)
+    args = parser.parse_args()
+
+    # A pool of distinct frames, cycled, so payload generation isn't measured
+    inbound = [twilio_media_message(i) for i in range(1000)]
+    outbound = [openai_delta_message(i) for i in range(1000)]
+    inbound = (inbound * (args.frames // len(inbound) + 1))[: args.frames]
+    outbound = (outbound * (args.frames // len(outbound) + 1))[: args.frames]
+
+    # Both paths must produce equivalent messages
+    fast_outbound = make_fast_outbound()
+    assert json.loads(fast_inbound(inbound[0])) == json.loads(
+        legacy_inbound(inbound[0])
+    )
+    assert json.loads(fast_outbound(outbound[0], STREAM_SID)) == json.loads(
+        legacy_outbound(outbound[0], STREAM_SID)
+    )
+
+    print(
+        f"{'relay':8} {'inbound':>10} {'outbound':>10} {'per call-second':>16} {'calls/core':>11}"
+    )
+    for name, inbound_fn, outbound_fn in (
+        ("legacy", legacy_inbound, legacy_outbound),
+        ("fast", fast_inbound, fast_outbound),
+    ):
+        inbound_cpu = cpu_per_frame(inbound_fn, inbound)
+        outbound_cpu = cpu_per_frame(outbound_fn, outbound, STREAM_SID)
+        per_call_second = FRAMES_PER_SECOND * (inbound_cpu + outbound_cpu)
+        print(
+            f"{name:8} {inbound_cpu * 1e6:8.2f}us {outbound_cpu * 1e6:8.2f}us "
+            f"{per_call_second * 1e3:13.3f}ms {1 / per_call_second:11.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
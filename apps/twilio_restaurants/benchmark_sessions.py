@@ -0,0 +1,121 @@
+"""
+Time to first audio for incoming calls, with and without pre-warmed sessions.
+
+Calls arrive at --rate per second (Poisson) against the mock realtime server,
+which simulates the handshake and session.update latency of the real API.
+Each call measures the time from opening the media stream to receiving its
+first audio frame, first with pre-warming off (every call opens its own
+session) and then with the session pool.
+
+Usage:
+    python -m apps.twilio_restaurants.benchmark_sessions --rate 2 --duration 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from contextlib import asynccontextmanager
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark-key")
+
+from websockets.asyncio.client import connect  # noqa: E402
+
+from apps.twilio_restaurants import mock_realtime, sessions  # noqa: E402
+from apps.twilio_restaurants.load_test import (  # noqa: E402
+    percentile,
+    send_audio,
+    start_app_server,
+    start_mock_realtime,
+)
+
+
+def pool_lifespan(max_size, rate_window):
+    @asynccontextmanager
+    async def lifespan(app):
+        app.state.realtime_sessions = sessions.RealtimeSessionPool(
+            sessions.open_realtime_session,
+            max_size=max_size,
+            rate_window=rate_window,
+        )
+        app.state.realtime_sessions.start()
+        try:
+            yield
+        finally:
+            await app.state.realtime_sessions.close()
+
+    return lifespan
+
+
+async def timed_call(url, hold):
+    """
+    Seconds from opening the media stream to the first audio frame back
+    """
+    start_time = time.perf_counter()
+    stream_sid = f"MZ{uuid.uuid4().hex}"
+    async with connect(url, max_queue=None) as websocket:
+        await websocket.send(
+            json.dumps({"event": "start", "start": {"streamSid": stream_sid}})
+        )
+        sender = asyncio.create_task(send_audio(websocket, stream_sid))
+        try:
+            async for message in websocket:
+                if '"event":"media"' in message:
+                    first_audio = time.perf_counter() - start_time
+                    break
+            await asyncio.sleep(hold)
+        finally:
+            sender.cancel()
+    return first_audio
+
+
+async def run_calls(url, rate, duration, hold):
+    calls = []
+    end_time = time.perf_counter() + duration
+    while time.perf_counter() < end_time:
+        calls.append(asyncio.create_task(timed_call(url, hold)))
+        await asyncio.sleep(random.expovariate(rate))
+    return await asyncio.gather(*calls)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rate", type=float, default=2, help="Calls per second")
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--hold", type=float, default=3, help="Seconds per call")
+    parser.add_argument("--connect-delay", type=float, default=0.3)
+    parser.add_argument("--session-delay", type=float, default=0.2)
+    parser.add_argument("--pool-max-size", type=int, default=8)
+    parser.add_argument("--rate-window", type=float, default=10)
+    parser.add_argument("--realtime-port", type=int, default=8014)
+    parser.add_argument("--app-port", type=int, default=8015)
+    args = parser.parse_args()
+
+    mock_realtime.CONNECT_DELAY = args.connect_delay
+    mock_realtime.SESSION_DELAY = args.session_delay
+    mock_realtime.TOOL_CALL_INTERVAL = 0
+    start_mock_realtime(args.realtime_port, mock_realtime.MockStats())
+    sessions.OPENAI_REALTIME_URL = f"ws://127.0.0.1:{args.realtime_port}"
+
+    for port, name, max_size in (
+        (args.app_port, "cold", 0),
+        (args.app_port + 1, "pre-warmed", args.pool_max_size),
+    ):
+        start_app_server(port, pool_lifespan(max_size, args.rate_window))
+        # Give the pool a moment to warm up, as it would before the first call
+        time.sleep(1)
+        url = f"ws://127.0.0.1:{port}/twilio_restaurants/media-stream"
+        first_audio = asyncio.run(run_calls(url, args.rate, args.duration, args.hold))
+        print(
+            f"{name:10} {len(first_audio)} calls: first audio "
+            f"p50 {percentile(first_audio, 50) * 1e3:.0f}ms, "
+            f"p95 {percentile(first_audio, 95) * 1e3:.0f}ms, "
+            f"max {max(first_audio) * 1e3:.0f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Capacity test: concurrent calls the voice agent sustains per worker count.
+
+For each --workers value, starts the agent under uvicorn with that many
+worker processes (no --reload, as in production) against mock realtime
+servers, then ramps up concurrent simulated calls until audio quality
+drops: more than --max-dropout-rate of frames arriving after the caller's
+playout buffer ran dry, or a p99 frame gap above --max-p99-gap. Every mock
+response ends in a make_reservation call, and the reservation store is
+checked afterwards for lost reservations or duplicate ids.
+
+Calls should scale roughly linearly with workers up to the number of cores.
+The mock servers and the simulated callers run on the same machine, so give
+them spare cores (--mock-processes, --client-processes) for a fair reading.
+
+Usage:
+    python -m apps.twilio_restaurants.capacity_test --workers 1,2,4 --calls 50,100,200,400
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from multiprocessing import get_context
+
+from apps.twilio_restaurants.load_test import percentile, run_calls
+
+RESERVATION_ARGUMENTS = json.dumps(
+    {
+        # One distinct booking per call; identical requests are stored once
+        "party_name": "Capacity Test {call_id}",
+        "date": "2025-05-15",
+        "time": "19:00",
+        "party_size": 2,
+    }
+)
+
+
+def wait_until_serving(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            urllib.request.urlopen(url, timeout=1).close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+def start_mock_realtime(port, processes):
+    env = {
+        **os.environ,
+        "MOCK_REALTIME_TOOL_NAME": "make_reservation",
+        "MOCK_REALTIME_TOOL_ARGUMENTS": RESERVATION_ARGUMENTS,
+    }
+    return [
+        subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "apps.twilio_restaurants.mock_realtime",
+                "--port",
+                str(port),
+                "--reuse-port",
+            ],
+            env=env,
+        )
+        for _ in range(processes)
+    ]
+
+
+def start_app(port, workers, realtime_port, database_url):
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "capacity-test-key"),
+        "OPENAI_REALTIME_URL": f"ws://127.0.0.1:{realtime_port}",
+        "RESERVATIONS_DATABASE_URL": database_url,
+    }
+    app = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "apps.twilio_restaurants.load_test:create_app",
+            "--factory",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+        ],
+        env=env,
+        # The agent logs every event; keep the report readable
+        stdout=subprocess.DEVNULL,
+    )
+    wait_until_serving(f"http://127.0.0.1:{port}/twilio_restaurants/")
+    return app
+
+
+def run_client(job):
+    url, calls, duration, warmup = job
+    return asyncio.run(run_calls(url, calls, duration, warmup))
+
+
+def measure(url, calls, client_processes, duration, warmup):
+    """
+    Frames received, audible dropouts and p99 gap for `calls` concurrent calls
+    """
+    processes = min(client_processes, calls)
+    jobs = [
+        (url, calls // processes + (i < calls % processes), duration, warmup)
+        for i in range(processes)
+    ]
+    with get_context("spawn").Pool(processes) as pool:
+        results = pool.map(run_client, jobs)
+    gaps = [gap for client_gaps, _ in results for gap in client_gaps]
+    dropouts = sum(client_dropouts for _, client_dropouts in results)
+    return len(gaps), dropouts, percentile(gaps, 99) if gaps else float("inf")
+
+
+def check_reservations(database_url):
+    from sqlalchemy import create_engine, func, select
+
+    from logic.realtime_api_openai.reservations_agent.reservation_store import (
+        reservations,
+    )
+
+    engine = create_engine(database_url)
+    with engine.connect() as connection:
+        count, distinct_ids = connection.execute(
+            select(func.count(), func.count(reservations.c.id.distinct()))
+        ).one()
+    engine.dispose()
+    return count, distinct_ids
+
+
+def main():
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", default=",".join(str(2**i) for i in range(4)))
+    parser.add_argument("--calls", default="25,50,100,200,400")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("--client-processes", type=int, default=cores)
+    parser.add_argument("--mock-processes", type=int, default=cores)
+    parser.add_argument("--max-dropout-rate", type=float, default=0.005)
+    parser.add_argument("--max-p99-gap", type=float, default=0.1)
+    parser.add_argument("--realtime-port", type=int, default=8019)
+    parser.add_argument("--app-port", type=int, default=8020)
+    args = parser.parse_args()
+
+    mocks = start_mock_realtime(args.realtime_port, args.mock_processes)
+    capacities = []
+    try:
+        for workers in (int(w) for w in args.workers.split(",")):
+            database_dir = tempfile.mkdtemp(prefix="reservations-")
+            database_url = f"sqlite:///{database_dir}/reservations.db"
+            app = start_app(args.app_port, workers, args.realtime_port, database_url)
+            url = f"ws://127.0.0.1:{args.app_port}/twilio_restaurants/media-stream"
+            capacity = 0
+            try:
+                for calls in (int(c) for c in args.calls.split(",")):
+                    frames, dropouts, p99_gap = measure(
+                        url, calls, args.client_processes, args.duration, args.warmup
+                    )
+                    dropout_rate = dropouts / frames if frames else 1.0
+                    passed = (
+                        dropout_rate <= args.max_dropout_rate
+                        and p99_gap <= args.max_p99_gap
+                    )
+                    print(
+                        f"workers {workers} calls {calls:4}: {frames} frames, "
+                        f"dropouts {dropout_rate:.2%}, p99 gap {p99_gap * 1e3:.0f}ms "
+                        f"{'ok' if passed else 'FAIL'}"
+                    )
+                    if not passed:
+                        break
+                    capacity = calls
+            finally:
+                app.terminate()
+                app.wait()
+            count, distinct_ids = check_reservations(database_url)
+            print(
+                f"workers {workers}: {count} reservations stored, "
+                f"{distinct_ids} distinct ids"
+            )
+            capacities.append((workers, capacity))
+    finally:
+        for mock in mocks:
+            mock.terminate()
+
+    print(f"\n{'workers':>7} {'calls':>6} {'calls/worker':>12}  ({cores} cores)")
+    for workers, capacity in capacities:
+        print(f"{workers:7} {capacity:6} {capacity / workers:12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import asyncio
+import os
+
+# How long to wait for the server to confirm an item before carrying on anyway
+ITEM_ACK_TIMEOUT = float(os.getenv("TWILIO_ITEM_ACK_TIMEOUT", "5"))
+
+
+class ItemAcks:
+    """
+    Lets a coroutine wait for the conversation.item.created event of an item it sent.
+
+    The websocket reader hands every conversation.item.created event to
+    created(), so waiting for an ack suspends only the waiting task: audio
+    keeps flowing for this call and every other call on the event loop.
+    """
+
+    def __init__(self):
+        self._pending = {}
+
+    def expect(self, item_type, call_id):
+        """
+        Register interest before sending the item, so a fast ack can't be missed
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._pending[(item_type, call_id)] = future
+        return future
+
+    def created(self, item):
+        future = self._pending.pop((item.get("type"), item.get("call_id")), None)
+        if future is not None and not future.done():
+            future.set_result(item)
+
+    async def wait(self, future, timeout=ITEM_ACK_TIMEOUT):
+        """
+        The created item, or None if the server didn't confirm it in time
+        """
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self._pending = {
+                key: pending
+                for key, pending in self._pending.items()
+                if pending is not future
+            }
+            print(f"No conversation.item.created within {timeout}s, continuing")
+            return None
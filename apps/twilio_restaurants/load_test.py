@@ -0,0 +1,219 @@
+"""
+Load test for the media-stream relay with N simulated Twilio calls.
+
+Starts the mock realtime server and the twilio_restaurants router locally.
+Every call streams 20ms frames both ways while the mock asks for a tool call
+every --tool-call-interval seconds (optionally slow, with --tool-latency),
+and the gaps between audio frames each caller receives are reported, along
+with audible dropouts (times a caller's playout buffer ran dry). As long as
+nothing blocks the event loop, gaps stay close to 20ms even while other
+calls are running tools. --cpu-hogs adds threads competing for the CPU and
+--frames-per-delta makes the mock send audio in bursts.
+--legacy-blocking-waits restores the old 2 x 200ms blocking sleeps per tool
+call for comparison.
+
+Usage:
+    python -m apps.twilio_restaurants.load_test --calls 20 --duration 10
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import threading
+import time
+import uuid
+
+os.environ.setdefault("OPENAI_API_KEY", "load-test-key")
+
+import uvicorn  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from websockets.asyncio.client import connect  # noqa: E402
+
+from apps.twilio_restaurants import mock_realtime, routes, sessions  # noqa: E402
+from apps.twilio_restaurants.item_acks import ItemAcks  # noqa: E402
+from logic.realtime_api_openai.reservations_agent import (  # noqa: E402
+    simple_websocket,
+)
+
+FRAME_INTERVAL = 0.02
+# A gap this long is audible as a dropout
+STALL_THRESHOLD = 0.1
+
+
+def start_mock_realtime(port, stats):
+    ready = threading.Event()
+    thread = threading.Thread(
+        target=asyncio.run,
+        args=(mock_realtime.run_server("127.0.0.1", port, stats, ready),),
+        daemon=True,
+    )
+    thread.start()
+    ready.wait()
+
+
+def create_app(lifespan=sessions.lifespan):
+    """
+    The voice agent on its own, without the other routers main.py mounts
+    """
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(routes.router, prefix="/twilio_restaurants")
+    return app
+
+
+def start_app_server(port, lifespan=sessions.lifespan):
+    app = create_app(lifespan)
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def legacy_blocking_wait(self, future, timeout=None):
+    threading.Event().wait(0.2)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def send_audio(websocket, stream_sid):
+    payload = base64.b64encode(b"\xff" * 160).decode()
+    timestamp = 0
+    next_frame = time.perf_counter()
+    while True:
+        # Twilio stamps each frame with the stream clock in ms
+        await websocket.send(
+            json.dumps(
+                {
+                    "event": "media",
+                    "streamSid": stream_sid,
+                    "media": {"timestamp": str(timestamp), "payload": payload},
+                }
+            )
+        )
+        timestamp += int(FRAME_INTERVAL * 1000)
+        next_frame += FRAME_INTERVAL
+        await asyncio.sleep(max(0.0, next_frame - time.perf_counter()))
+
+
+async def simulated_call(url, duration, warmup):
+    """
+    One Twilio call; returns the gaps between received audio frames and the
+    number of audible dropouts after warmup
+    """
+    stream_sid = f"MZ{uuid.uuid4().hex}"
+    gaps = []
+    dropouts = 0
+    # When the audio received so far finishes playing, like Twilio's buffer
+    play_end = None
+    async with connect(url, max_queue=None) as websocket:
+        await websocket.send(
+            json.dumps({"event": "start", "start": {"streamSid": stream_sid}})
+        )
+        sender = asyncio.create_task(send_audio(websocket, stream_sid))
+        start_time = time.perf_counter()
+        last_frame = None
+        try:
+            while True:
+                remaining = start_time + duration - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    message = await asyncio.wait_for(websocket.recv(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                now = time.perf_counter()
+                if '"event":"media"' not in message:
+                    continue
+                if last_frame is not None and now - start_time > warmup:
+                    gaps.append(now - last_frame)
+                    if now > play_end:
+                        dropouts += 1
+                last_frame = now
+                play_end = max(play_end or now, now) + FRAME_INTERVAL
+        finally:
+            sender.cancel()
+    return gaps, dropouts
+
+
+async def run_calls(url, calls, duration, warmup):
+    results = await asyncio.gather(
+        *(simulated_call(url, duration, warmup) for _ in range(calls))
+    )
+    gaps = [gap for call_gaps, _ in results for gap in call_gaps]
+    return gaps, sum(dropouts for _, dropouts in results)
+
+
+def hog_cpu():
+    while True:
+        sum(range(10000))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--warmup", type=float, default=1)
+    parser.add_argument("--tool-call-interval", type=float, default=2)
+    parser.add_argument("--tools-per-response", type=int, default=1)
+    parser.add_argument(
+        "--tool-latency",
+        type=float,
+        default=0,
+        help="Seconds each tool call blocks, like a slow database query",
+    )
+    parser.add_argument("--frames-per-delta", type=int, default=1)
+    parser.add_argument("--cpu-hogs", type=int, default=0)
+    parser.add_argument("--realtime-port", type=int, default=8012)
+    parser.add_argument("--app-port", type=int, default=8013)
+    parser.add_argument("--legacy-blocking-waits", action="store_true")
+    args = parser.parse_args()
+
+    mock_realtime.TOOL_CALL_INTERVAL = args.tool_call_interval
+    mock_realtime.TOOLS_PER_RESPONSE = args.tools_per_response
+    mock_realtime.FRAMES_PER_DELTA = args.frames_per_delta
+    if args.tool_latency:
+        get_popular_dishes = simple_websocket.get_popular_dishes
+
+        def slow_get_popular_dishes():
+            time.sleep(args.tool_latency)
+            return get_popular_dishes()
+
+        simple_websocket.get_popular_dishes = slow_get_popular_dishes
+    stats = mock_realtime.MockStats()
+    start_mock_realtime(args.realtime_port, stats)
+    sessions.OPENAI_REALTIME_URL = f"ws://127.0.0.1:{args.realtime_port}"
+    if args.legacy_blocking_waits:
+        ItemAcks.wait = legacy_blocking_wait
+    start_app_server(args.app_port)
+    for _ in range(args.cpu_hogs):
+        threading.Thread(target=hog_cpu, daemon=True).start()
+
+    url = f"ws://127.0.0.1:{args.app_port}/twilio_restaurants/media-stream"
+    gaps, dropouts = asyncio.run(run_calls(url, args.calls, args.duration, args.warmup))
+
+    stalls = sum(1 for gap in gaps if gap > STALL_THRESHOLD)
+    print(
+        f"{args.calls} calls, {len(gaps)} frames: gap p50 {percentile(gaps, 50) * 1e3:.1f}ms, "
+        f"p99 {percentile(gaps, 99) * 1e3:.1f}ms, max {max(gaps) * 1e3:.1f}ms, "
+        f"{stalls} gaps over {STALL_THRESHOLD * 1e3:.0f}ms, "
+        f"{dropouts} audible dropouts"
+    )
+    round_trips = stats.tool_round_trips
+    if round_trips:
+        print(
+            f"{stats.tool_calls} tool calls, {len(round_trips)} completed: "
+            f"round trip p50 {percentile(round_trips, 50) * 1e3:.1f}ms, "
+            f"max {max(round_trips) * 1e3:.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
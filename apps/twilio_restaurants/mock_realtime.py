@@ -0,0 +1,280 @@
+"""
+Minimal OpenAI realtime websocket server used for local load tests.
+
+Once the caller's audio starts arriving, every session streams 20ms u-law
+audio deltas continuously and periodically asks for a tool call,
+acknowledging each conversation.item.create with a conversation.item.created
+event like the real API. MOCK_REALTIME_CONNECT_DELAY and
+MOCK_REALTIME_SESSION_DELAY simulate the handshake and session.update
+latency of the real API.
+
+With MOCK_REALTIME_RESPONSE_SECONDS set, a session instead speaks one long
+response, generated faster than real time, and the caller "talks over" it
+after MOCK_REALTIME_BARGE_IN_AFTER seconds (input_audio_buffer.speech_started).
+
+Run it standalone with:
+    python -m apps.twilio_restaurants.mock_realtime --port 8002
+and point the app at it with OPENAI_REALTIME_URL=ws://127.0.0.1:8002
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import time
+import uuid
+
+from websockets.asyncio.server import serve
+from websockets.exceptions import ConnectionClosed
+
+# Simulated upstream behaviour
+FRAME_INTERVAL = float(os.getenv("MOCK_REALTIME_FRAME_INTERVAL", "0.02"))
+TOOL_CALL_INTERVAL = float(os.getenv("MOCK_REALTIME_TOOL_CALL_INTERVAL", "2"))
+ACK_DELAY = float(os.getenv("MOCK_REALTIME_ACK_DELAY", "0.05"))
+TOOLS_PER_RESPONSE = int(os.getenv("MOCK_REALTIME_TOOLS_PER_RESPONSE", "1"))
+TOOL_NAME = os.getenv("MOCK_REALTIME_TOOL_NAME", "get_popular_dishes")
+# "{call_id}" in the arguments is replaced with each call's id
+TOOL_ARGUMENTS = os.getenv("MOCK_REALTIME_TOOL_ARGUMENTS", "{}")
+# Audio frames per delta; above 1 the audio arrives in bursts, like the real API
+FRAMES_PER_DELTA = int(os.getenv("MOCK_REALTIME_FRAMES_PER_DELTA", "1"))
+CONNECT_DELAY = float(os.getenv("MOCK_REALTIME_CONNECT_DELAY", "0"))
+SESSION_DELAY = float(os.getenv("MOCK_REALTIME_SESSION_DELAY", "0"))
+# Barge-in scenario
+RESPONSE_SECONDS = float(os.getenv("MOCK_REALTIME_RESPONSE_SECONDS", "0"))
+RESPONSE_SPEED = float(os.getenv("MOCK_REALTIME_RESPONSE_SPEED", "5"))
+BARGE_IN_AFTER = float(os.getenv("MOCK_REALTIME_BARGE_IN_AFTER", "1.5"))
+
+
+def _silence_delta(frames):
+    """
+    A delta with `frames` x 20ms of u-law silence
+    """
+    return json.dumps(
+        {
+            "type": "response.audio.delta",
+            "response_id": "resp_mock",
+            "item_id": "item_mock",
+            "output_index": 0,
+            "content_index": 0,
+            "delta": base64.b64encode(b"\xff" * 160 * frames).decode(),
+        }
+    )
+
+
+class MockStats:
+    def __init__(self):
+        self.sessions = 0
+        self.audio_appends = 0
+        self.tool_calls = 0
+        # Seconds from asking for tool calls to receiving the follow-up response.create
+        self.tool_round_trips = []
+        # perf_counter() of each input_audio_buffer.speech_started sent
+        self.speech_started_at = []
+        self.cancels = 0
+        self.truncations = []
+
+
+async def _ack_item(websocket, item):
+    await asyncio.sleep(ACK_DELAY)
+    await websocket.send(
+        json.dumps(
+            {
+                "type": "conversation.item.created",
+                "previous_item_id": None,
+                "item": {**item, "id": f"item_{uuid.uuid4().hex[:20]}"},
+            }
+        )
+    )
+
+
+async def _session_updated(websocket, session):
+    await asyncio.sleep(SESSION_DELAY)
+    await websocket.send(json.dumps({"type": "session.updated", "session": session}))
+
+
+async def _request_tools(websocket, tool_calls_started, stats):
+    """
+    End a response with TOOLS_PER_RESPONSE parallel tool calls
+    """
+    response_id = f"resp_{uuid.uuid4().hex[:16]}"
+    tool_calls_started.append(time.perf_counter())
+    for _ in range(TOOLS_PER_RESPONSE):
+        stats.tool_calls += 1
+        call_id = f"call_{uuid.uuid4().hex[:16]}"
+        await websocket.send(
+            json.dumps(
+                {
+                    "type": "response.function_call_arguments.done",
+                    "response_id": response_id,
+                    "name": TOOL_NAME,
+                    "arguments": TOOL_ARGUMENTS.replace("{call_id}", call_id),
+                    "call_id": call_id,
+                }
+            )
+        )
+    await websocket.send(
+        json.dumps(
+            {
+                "type": "response.done",
+                "response": {"id": response_id, "status": "completed"},
+            }
+        )
+    )
+
+
+async def _stream_audio(websocket, tool_calls_started, stats):
+    delta = _silence_delta(FRAMES_PER_DELTA)
+    next_frame = time.perf_counter()
+    next_tool_call = next_frame + TOOL_CALL_INTERVAL
+    while True:
+        if TOOL_CALL_INTERVAL and time.perf_counter() >= next_tool_call:
+            next_tool_call += TOOL_CALL_INTERVAL
+            await _request_tools(websocket, tool_calls_started, stats)
+        await websocket.send(delta)
+        # Absolute schedule, so one late frame doesn't shift every later one
+        next_frame += FRAME_INTERVAL * FRAMES_PER_DELTA
+        await asyncio.sleep(max(0.0, next_frame - time.perf_counter()))
+
+
+async def _barge_in(websocket, stats):
+    await asyncio.sleep(BARGE_IN_AFTER)
+    stats.speech_started_at.append(time.perf_counter())
+    await websocket.send(
+        json.dumps(
+            {
+                "type": "input_audio_buffer.speech_started",
+                "audio_start_ms": int(BARGE_IN_AFTER * 1000),
+                "item_id": f"item_{uuid.uuid4().hex[:20]}",
+            }
+        )
+    )
+
+
+async def _respond_until_cancelled(websocket, cancelled):
+    response_id = f"resp_{uuid.uuid4().hex[:16]}"
+    await websocket.send(
+        json.dumps(
+            {
+                "type": "response.created",
+                "response": {"id": response_id, "status": "in_progress"},
+            }
+        )
+    )
+    delta = json.dumps(
+        {
+            "type": "response.audio.delta",
+            "response_id": response_id,
+            "item_id": f"item_{uuid.uuid4().hex[:20]}",
+            "output_index": 0,
+            "content_index": 0,
+            "delta": base64.b64encode(b"\xff" * 160).decode(),
+        }
+    )
+    status = "completed"
+    next_frame = time.perf_counter()
+    for _ in range(int(RESPONSE_SECONDS / FRAME_INTERVAL)):
+        if cancelled.is_set():
+            status = "cancelled"
+            break
+        await websocket.send(delta)
+        next_frame += FRAME_INTERVAL / RESPONSE_SPEED
+        await asyncio.sleep(max(0.0, next_frame - time.perf_counter()))
+    await websocket.send(
+        json.dumps(
+            {"type": "response.done", "response": {"id": response_id, "status": status}}
+        )
+    )
+
+
+def make_handler(stats):
+    async def handler(websocket):
+        stats.sessions += 1
+        # Start times of responses that ended in tool calls, oldest first
+        tool_calls_started = []
+        # Acks and other background sends
+        tasks = set()
+        audio = None
+        cancelled = asyncio.Event()
+
+        def start_task(coroutine):
+            task = asyncio.create_task(coroutine)
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        await websocket.send(json.dumps({"type": "session.created", "session": {}}))
+        try:
+            async for message in websocket:
+                event = json.loads(message)
+                if event["type"] == "input_audio_buffer.append":
+                    stats.audio_appends += 1
+                    # The "model" starts talking once the caller does
+                    if audio is None and RESPONSE_SECONDS:
+                        audio = asyncio.create_task(
+                            _respond_until_cancelled(websocket, cancelled)
+                        )
+                        start_task(_barge_in(websocket, stats))
+                    elif audio is None:
+                        audio = asyncio.create_task(
+                            _stream_audio(websocket, tool_calls_started, stats)
+                        )
+                elif event["type"] == "session.update":
+                    start_task(_session_updated(websocket, event["session"]))
+                elif event["type"] == "conversation.item.create":
+                    start_task(_ack_item(websocket, event["item"]))
+                elif event["type"] == "response.create":
+                    if tool_calls_started:
+                        started = tool_calls_started.pop(0)
+                        stats.tool_round_trips.append(time.perf_counter() - started)
+                elif event["type"] == "response.cancel":
+                    stats.cancels += 1
+                    cancelled.set()
+                elif event["type"] == "conversation.item.truncate":
+                    stats.truncations.append(event["audio_end_ms"])
+        except ConnectionClosed:
+            pass
+        finally:
+            if audio is not None:
+                audio.cancel()
+            for task in tasks:
+                task.cancel()
+
+    return handler
+
+
+async def _delay_handshake(connection, request):
+    await asyncio.sleep(CONNECT_DELAY)
+
+
+async def run_server(host, port, stats=None, ready=None, reuse_port=False):
+    """
+    Serve until cancelled; `ready` (a threading.Event) is set once listening
+    """
+    async with serve(
+        make_handler(stats or MockStats()),
+        host,
+        port,
+        max_queue=None,
+        process_request=_delay_handshake,
+        reuse_port=reuse_port,
+    ):
+        if ready is not None:
+            ready.set()
+        await asyncio.Future()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8002)
+    parser.add_argument(
+        "--reuse-port",
+        action="store_true",
+        help="Let several mock processes share the port",
+    )
+    args = parser.parse_args()
+    asyncio.run(run_server(args.host, args.port, reuse_port=args.reuse_port))
+
+
+if __name__ == "__main__":
+    main()
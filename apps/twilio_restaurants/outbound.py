@@ -0,0 +1,161 @@
+"""
+Per-call outbound audio queue that paces the assistant's audio to Twilio.
+
+The realtime API sends audio in bursts, faster than real time. Instead of
+forwarding each burst as one large write, deltas are repacked into fixed
+20ms u-law frames and sent on a real-time schedule. A few frames are kept in
+flight ahead of the schedule so Twilio never runs dry when this process is
+briefly late (e.g. under CPU contention). The queue is bounded, so memory per
+call stays flat however far ahead the model gets.
+"""
+
+import asyncio
+import binascii
+import os
+import time
+from collections import deque
+
+FRAME_BYTES = 160  # 20ms of 8kHz u-law
+FRAME_INTERVAL = 0.02
+# Most audio a call may queue; beyond this the oldest frames are dropped
+MAX_BUFFER_SECONDS = float(os.getenv("TWILIO_OUTBOUND_BUFFER_SECONDS", "60"))
+# Frames sent ahead of the real-time schedule, absorbing scheduling jitter
+LEAD_FRAMES = int(os.getenv("TWILIO_OUTBOUND_LEAD_FRAMES", "3"))
+# Frames to collect before (re)starting playback, absorbing network jitter
+PREBUFFER_FRAMES = int(os.getenv("TWILIO_OUTBOUND_PREBUFFER_FRAMES", "3"))
+
+_SILENCE = b"\xff"
+
+
+class OutboundAudio:
+    """
+    Jitter buffer for one call.
+
+    push() queues a base64 delta; run() sends (item_id, base64 frame) pairs to
+    `send_frame` in real time and calls `drained` after the last frame of
+    each run of audio. `underruns` counts the times Twilio ran out of audio
+    mid-response (the model fell behind, or this process was late);
+    `overruns` counts frames dropped because the buffer was full.
+    """
+
+    def __init__(self, send_frame, drained, max_buffer_seconds=MAX_BUFFER_SECONDS):
+        self._send_frame = send_frame
+        self._drained = drained
+        self._frames = deque()
+        self._max_frames = int(max_buffer_seconds / FRAME_INTERVAL)
+        self._partial = b""
+        self._partial_item = None
+        # False between response.audio.done and the next delta; an empty
+        # queue then is the end of the audio, not an underrun
+        self._generating = False
+        self._arrived = asyncio.Event()
+        # When the audio sent so far finishes playing on Twilio's side
+        self._play_end = 0.0
+        # Set by clear() to end the current run without counting an underrun
+        self._cleared = False
+        self.underruns = 0
+        self.overruns = 0
+
+    def __len__(self):
+        return len(self._frames)
+
+    @property
+    def playing(self):
+        return bool(self._frames) or time.perf_counter() < self._play_end
+
+    def push(self, item_id, delta):
+        if item_id != self._partial_item:
+            self._flush_partial()
+            self._partial_item = item_id
+        audio = self._partial + binascii.a2b_base64(delta)
+        whole = len(audio) - len(audio) % FRAME_BYTES
+        for start in range(0, whole, FRAME_BYTES):
+            self._append(item_id, audio[start : start + FRAME_BYTES])
+        self._partial = audio[whole:]
+        self._generating = True
+        self._arrived.set()
+
+    def end(self):
+        """
+        No more audio is coming for now (response.audio.done)
+        """
+        self._flush_partial()
+        self._generating = False
+        self._arrived.set()
+
+    def clear(self):
+        """
+        Drop everything queued (barge-in)
+        """
+        self._frames.clear()
+        self._partial = b""
+        self._partial_item = None
+        self._generating = False
+        self._play_end = 0.0
+        self._cleared = True
+        # Wake a run waiting for the next delta so it ends now
+        self._arrived.set()
+
+    async def run(self):
+        lead = LEAD_FRAMES * FRAME_INTERVAL
+        while True:
+            await self._wait_for_audio()
+            self._cleared = False
+            self._play_end = time.perf_counter()
+            first_frame = True
+            while not self._cleared:
+                if self._frames:
+                    ahead = self._play_end - time.perf_counter()
+                    if ahead > lead:
+                        await asyncio.sleep(ahead - lead)
+                        continue
+                    if ahead < 0 and not first_frame:
+                        # This process was late and Twilio ran dry
+                        self.underruns += 1
+                    first_frame = False
+                    item_id, frame = self._frames.popleft()
+                    await self._send_frame(
+                        item_id, binascii.b2a_base64(frame, newline=False).decode()
+                    )
+                    self._play_end = (
+                        max(self._play_end, time.perf_counter()) + FRAME_INTERVAL
+                    )
+                elif not self._generating:
+                    break
+                else:
+                    # Wait for the model, until the audio Twilio has runs out
+                    try:
+                        await asyncio.wait_for(
+                            self._next_arrival(),
+                            self._play_end - time.perf_counter(),
+                        )
+                    except asyncio.TimeoutError:
+                        if not self._cleared:
+                            self.underruns += 1
+                        break
+            await self._drained()
+
+    async def _next_arrival(self):
+        self._arrived.clear()
+        await self._arrived.wait()
+
+    async def _wait_for_audio(self):
+        # Prebuffer a few frames before (re)starting, so one late delta
+        # doesn't run Twilio dry straight away
+        while not self._frames or (
+            self._generating and len(self._frames) < PREBUFFER_FRAMES
+        ):
+            await self._next_arrival()
+
+    def _append(self, item_id, frame):
+        if len(self._frames) >= self._max_frames:
+            self._frames.popleft()
+            self.overruns += 1
+        self._frames.append((item_id, frame))
+
+    def _flush_partial(self):
+        # Pad the tail of an item to a whole frame with silence
+        if self._partial:
+            padding = _SILENCE * (FRAME_BYTES - len(self._partial))
+            self._append(self._partial_item, self._partial + padding)
+        self._partial = b""
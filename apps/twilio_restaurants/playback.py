@@ -0,0 +1,59 @@
+"""
+What the caller has actually heard of the assistant's audio, for barge-in.
+
+The realtime API generates audio faster than real time, so by the time the
+caller starts talking there may be seconds of it queued for the call. Each
+time the outbound queue runs dry a mark follows the last frame; Twilio
+echoes a mark once the audio before it has played, so an outstanding mark
+means audio is still playing. The played offset is measured on Twilio's
+media stream clock.
+"""
+
+# G.711 u-law at 8kHz: 8 bytes per millisecond
+_BYTES_PER_MS = 8
+
+
+class Playback:
+    def __init__(self):
+        # Twilio's stream clock (ms), from the timestamp of the latest inbound frame
+        self.latest_media_timestamp = 0
+        # The response currently generating, between response.created and response.done
+        self.active_response_id = None
+        # Deltas of an interrupted response still in flight are dropped
+        self.interrupted_response_id = None
+        self.item_id = None
+        self._item_started_at = None
+        self._item_sent_ms = 0
+        self._pending_marks = 0
+
+    def sent(self, item_id, payload):
+        """
+        Record a base64 media payload that went to Twilio
+        """
+        if item_id != self.item_id:
+            self.item_id = item_id
+            self._item_started_at = self.latest_media_timestamp
+            self._item_sent_ms = 0
+        self._item_sent_ms += len(payload) * 3 // 4 // _BYTES_PER_MS
+
+    def mark_sent(self):
+        self._pending_marks += 1
+
+    def mark_played(self):
+        if self._pending_marks:
+            self._pending_marks -= 1
+
+    def interrupt(self, audio_queued=False):
+        """
+        Stop tracking the current audio; returns (item_id, audio_end_ms) of the
+        item the caller was listening to, or None if nothing is left to play
+        """
+        self.interrupted_response_id = self.active_response_id
+        truncation = None
+        if (audio_queued or self._pending_marks) and self.item_id is not None:
+            played_ms = self.latest_media_timestamp - self._item_started_at
+            truncation = (self.item_id, max(0, min(played_ms, self._item_sent_ms)))
+        self.item_id = None
+        self._item_started_at = None
+        self._pending_marks = 0
+        return truncation
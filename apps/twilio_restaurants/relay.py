@@ -0,0 +1,71 @@
+"""
+Audio relay fast path between Twilio media streams and the OpenAI realtime API.
+
+Both sides carry G.711 u-law audio as base64 strings, so inbound payloads are
+passed through untouched: never decoded, re-encoded or re-escaped (the base64
+alphabet needs no JSON escaping; anything else is serialized normally). Outbound audio is only decoded to be
+repacked into 20ms frames (see outbound.py). Incoming frames are parsed with
+orjson and outgoing envelopes are assembled from pre-built string templates.
+"""
+
+import re
+
+import orjson
+
+_AUDIO_APPEND_PREFIX = '{"type":"input_audio_buffer.append","audio":"'
+_ENVELOPE_SUFFIX = '"}'
+_MEDIA_SUFFIX = '"}}'
+_BASE64 = re.compile(r"[A-Za-z0-9+/=]*")
+
+# Parse a JSON text frame; several times faster than json.loads
+loads = orjson.loads
+
+
+def dumps(value):
+    """
+    Serialize a control message (session.update, tool output, ...) to a text frame
+    """
+    return orjson.dumps(value).decode("utf-8")
+
+
+def audio_append_event(payload):
+    """
+    OpenAI input_audio_buffer.append event for a Twilio media payload
+    """
+    # Spliced in raw only when it can't break out of the JSON string
+    if isinstance(payload, str) and _BASE64.fullmatch(payload):
+        return _AUDIO_APPEND_PREFIX + payload + _ENVELOPE_SUFFIX
+    return dumps({"type": "input_audio_buffer.append", "audio": payload})
+
+
+class MediaFrames:
+    """
+    Builds Twilio outbound media messages for one stream.
+
+    The envelope around the payload only changes when the stream starts, so
+    it is serialized once and each frame is a single string concatenation.
+    The stream's mark and clear messages never change, so they are built once too.
+    """
+
+    def __init__(self, stream_sid=None):
+        self.stream_sid = stream_sid
+
+    @property
+    def stream_sid(self):
+        return self._stream_sid
+
+    @stream_sid.setter
+    def stream_sid(self, stream_sid):
+        self._stream_sid = stream_sid
+        self._prefix = (
+            '{"event":"media","streamSid":'
+            + dumps(stream_sid)
+            + ',"media":{"payload":"'
+        )
+        self.mark = dumps(
+            {"event": "mark", "streamSid": stream_sid, "mark": {"name": "delta"}}
+        )
+        self.clear = dumps({"event": "clear", "streamSid": stream_sid})
+
+    def media(self, payload):
+        return self._prefix + payload + _MEDIA_SUFFIX
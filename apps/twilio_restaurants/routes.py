@@ -1,39 +1,32 @@
-import os
-import json
-import base64
 import asyncio
-import websockets
-import threading
+import os
 
 
 from websockets.protocol import State as ConnectionState
-from fastapi import APIRouter, FastAPI, WebSocket, Request
+from fastapi import APIRouter, Depends, FastAPI, WebSocket, Request
 from fastapi.responses import JSONResponse, HTMLResponse
 from fastapi.websockets import WebSocketDisconnect
 from twilio.twiml.voice_response import VoiceResponse, Connect, Say, Stream
-from dotenv import load_dotenv
-
+from apps.metrics.registry import REGISTRY
+from apps.twilio_restaurants.item_acks import ItemAcks
+from apps.twilio_restaurants.outbound import OutboundAudio
+from apps.twilio_restaurants.playback import Playback
+from apps.twilio_restaurants.relay import (
+    MediaFrames,
+    audio_append_event,
+    dumps,
+    loads,
+)
+from apps.twilio_restaurants.sessions import (
+    RealtimeSessionPool,
+    get_realtime_sessions,
+)
 from logic.realtime_api_openai.reservations_agent.simple_websocket import (
     function_definitions,
     handle_function_call,
 )
 
-load_dotenv()
-
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-SYSTEM_MESSAGE = (
-    "You are an agent who makes restaurant reservations."
-    "To make a reservation, you need to collect the following required information: name of the party, date, time, and the size of the party."
-    "All these fields are required"
-    "You should talk like a restaurant front desk assistant gathering this information in a friendly, professional manner."
-    "Before finalizing any reservation, you must restate all the reservation details to the user and ask for confirmation."
-    "Only when the user confirms all details should you make the reservation by calling the make_reservation function."
-    "You have a bunch of tools at your disposal. When the user asks you about popular dishes or what's good in the restaurant, only stick to details returned from function call."
-    "Don't make up names of dishes, prices, or anything else that's not returned to you from the function."
-)
-VOICE = "alloy"
-
-LOG_EVENT_TYPES = [
+LOG_EVENT_TYPES = {
     "response.content.done",
     "rate_limits.updated",
     "response.done",
@@ -43,10 +36,22 @@ LOG_EVENT_TYPES = [
     "session.created",
     "response.function_call_arguments.done",
     "error",
-]
+}
+
+# Stop the assistant's audio as soon as the caller starts talking
+BARGE_IN = os.getenv("TWILIO_BARGE_IN", "1") == "1"
 
 router = APIRouter()
 
+outbound_underruns = REGISTRY.counter(
+    "twilio_outbound_underruns_total",
+    "Times Twilio ran out of a call's audio in the middle of a response",
+)
+outbound_overruns = REGISTRY.counter(
+    "twilio_outbound_overruns_total",
+    "Outbound audio frames dropped because a call's buffer was full",
+)
+
 
 @router.get("/", response_class=JSONResponse)
 async def health():
@@ -72,132 +77,207 @@ async def handle_incoming_call(request: Request):
 
 
 @router.websocket("/media-stream")
-async def handle_media_stream(websocket: WebSocket):
+async def handle_media_stream(
+    websocket: WebSocket,
+    sessions: RealtimeSessionPool = Depends(get_realtime_sessions),
+):
     print("Client connected")
     await websocket.accept()
 
-    async with websockets.connect(
-        "wss://api.openai.com/v1/realtime?model=gpt-4o-realtime-preview-2024-12-17",
-        additional_headers={
-            "Authorization": f"Bearer {OPENAI_API_KEY}",
-            "OpenAI-Beta": "realtime=v1",
-        },
-    ) as openai_ws:
-        await send_session_update(openai_ws)
-        stream_sid = None
+    # Usually a pre-warmed session, already connected and configured
+    async with await sessions.acquire() as openai_ws:
+        # Outbound media envelope for this call's stream, filled in on "start"
+        media_frames = MediaFrames()
+        playback = Playback()
+
+        async def send_frame(item_id, payload):
+            await websocket.send_text(media_frames.media(payload))
+            playback.sent(item_id, payload)
+
+        async def drained():
+            await websocket.send_text(media_frames.mark)
+            playback.mark_sent()
+
+        # Repacks the assistant's audio into 20ms frames sent in real time
+        outbound = OutboundAudio(send_frame, drained)
+        item_acks = ItemAcks()
+        tool_tasks = set()
+        # Tool calls of each response, so one follow-up response covers all of them
+        tool_calls_by_response = {}
+
+        def start_task(coroutine):
+            task = asyncio.create_task(coroutine)
+            tool_tasks.add(task)
+            task.add_done_callback(tool_tasks.discard)
+            return task
+
+        async def run_tool_call(function_name, arguments, call_id):
+            try:
+                # IMPORTANT: First, add a function_call item to the conversation history
+                function_call_event = {
+                    "type": "conversation.item.create",
+                    "item": {
+                        "type": "function_call",
+                        "call_id": call_id,
+                        "name": function_name,
+                        "arguments": arguments,
+                    },
+                }
+                print("Sending function_call event to OpenAI API")
+                created = item_acks.expect("function_call", call_id)
+                await openai_ws.send(dumps(function_call_event))
+                # The output can only be attached once the server has the function_call item
+                await item_acks.wait(created)
+
+                print("Calling function handle_function_call")
+                created = item_acks.expect("function_call_output", call_id)
+                await handle_function_call(
+                    ws=openai_ws,
+                    function_name=function_name,
+                    arguments_str=arguments,
+                    call_id=call_id,
+                )
+                # The follow-up response must not start before the output is in the conversation
+                await item_acks.wait(created)
+            except Exception as e:
+                print(f"Error handling tool call {function_name}: {e}")
+
+        async def respond_after_tools(tool_calls):
+            # Independent tool calls of one response run concurrently; continue once all are in
+            await asyncio.gather(*tool_calls, return_exceptions=True)
+            await openai_ws.send(
+                dumps(
+                    {
+                        "type": "response.create",
+                        "response": {
+                            "modalities": ["text", "audio"],
+                            "tools": function_definitions,
+                            "tool_choice": "auto",
+                        },
+                    }
+                )
+            )
+
+        async def interrupt():
+            playing = outbound.playing
+            outbound.clear()
+            truncation = playback.interrupt(audio_queued=playing)
+            # Flush the audio Twilio still has buffered first: that's what the caller hears
+            if truncation:
+                await websocket.send_text(media_frames.clear)
+            if playback.active_response_id:
+                await openai_ws.send(dumps({"type": "response.cancel"}))
+            if truncation:
+                # Keep the conversation to what the caller actually heard
+                item_id, audio_end_ms = truncation
+                await openai_ws.send(
+                    dumps(
+                        {
+                            "type": "conversation.item.truncate",
+                            "item_id": item_id,
+                            "content_index": 0,
+                            "audio_end_ms": audio_end_ms,
+                        }
+                    )
+                )
 
         async def receive_from_twilio():
-            nonlocal stream_sid
             try:
                 async for message in websocket.iter_text():
-                    data = json.loads(message)
-                    if data["event"] == "start":
-                        stream_sid = data["start"]["streamSid"]
-                        print(f"Incoming stream has started {stream_sid}")
-                    elif (
+                    data = loads(message)
+                    if (
                         data["event"] == "media"
                         and openai_ws.state == ConnectionState.OPEN
                     ):
-                        audio_append = {
-                            "type": "input_audio_buffer.append",
-                            "audio": data["media"]["payload"],
-                        }
-                        await openai_ws.send(json.dumps(audio_append))
+                        # Hot path: the base64 payload is forwarded as-is
+                        await openai_ws.send(
+                            audio_append_event(data["media"]["payload"])
+                        )
+                        playback.latest_media_timestamp = int(
+                            data["media"]["timestamp"]
+                        )
+                    elif data["event"] == "mark":
+                        playback.mark_played()
+                    elif data["event"] == "start":
+                        media_frames.stream_sid = data["start"]["streamSid"]
+                        print(f"Incoming stream has started {media_frames.stream_sid}")
             except WebSocketDisconnect:
-                print("Client disconnected")
-                if openai_ws.open:
-                    await openai_ws.close()
+                pass
+            # iter_text() also ends quietly on disconnect; either way the call is
+            # over, and closing the realtime session ends send_to_twilio too
+            print("Client disconnected")
+            pacer.cancel()
+            await openai_ws.close()
 
         async def send_to_twilio():
-            nonlocal stream_sid
             try:
                 async for openai_message in openai_ws:
-                    response = json.loads(openai_message)
+                    response = loads(openai_message)
+                    if response["type"] == "response.audio.delta":
+                        # Hot path: queue the delta for pacing, unless its
+                        # response was interrupted
+                        if (
+                            response.get("delta")
+                            and response["response_id"]
+                            != playback.interrupted_response_id
+                        ):
+                            outbound.push(response["item_id"], response["delta"])
+                        continue
+                    if response["type"] == "response.audio.done":
+                        outbound.end()
                     if response["type"] in LOG_EVENT_TYPES:
                         print(f"Received event: {response['type']}")
                     if response["type"] == "session.updated":
                         print("Session updated successfully:")
+                    if response["type"] == "response.created":
+                        playback.active_response_id = response["response"]["id"]
+                    if (
+                        response["type"] == "input_audio_buffer.speech_started"
+                        and BARGE_IN
+                    ):
+                        await interrupt()
+                    if response["type"] == "conversation.item.created":
+                        item_acks.created(response["item"])
                     if response["type"] == "response.function_call_arguments.done":
-                        # Handle function call from the LLM
-                        function_name = response.get("name")
-                        arguments = response.get("arguments", "{}")
-                        call_id = response.get("call_id")
-
-                        # IMPORTANT: First, add a function_call item to the conversation history
-                        function_call_event = {
-                            "type": "conversation.item.create",
-                            "item": {
-                                "type": "function_call",
-                                "call_id": call_id,
-                                "name": function_name,
-                                "arguments": arguments,
-                            },
-                        }
-                        print("Sending function_call event to OpenAI API")
-                        await openai_ws.send(json.dumps(function_call_event))
-
-                        # Wait a moment for this to be processed
-                        threading.Event().wait(0.2)
-
-                        print("Calling function handle_function_call")
-                        await handle_function_call(
-                            ws=openai_ws,
-                            function_name=function_name,
-                            arguments_str=arguments,
-                            call_id=call_id,
-                        )
-
-                        # Wait a moment for this to be processed
-                        threading.Event().wait(0.2) 
-
-                        await openai_ws.send(
-                            json.dumps(
-                                {
-                                    "type": "response.create",
-                                    "response": {
-                                        "modalities": ["text", "audio"],
-                                        "tools": function_definitions,
-                                        "tool_choice": "auto",
-                                    },
-                                }
+                        # Run the tool in its own task so this loop keeps relaying audio
+                        # and can deliver the acks the tool call waits for
+                        task = start_task(
+                            run_tool_call(
+                                function_name=response.get("name"),
+                                arguments=response.get("arguments", "{}"),
+                                call_id=response.get("call_id"),
                             )
                         )
+                        tool_calls_by_response.setdefault(
+                            response.get("response_id"), []
+                        ).append(task)
+                    if response["type"] == "response.done":
+                        playback.active_response_id = None
+                        outbound.end()
+                        # Every tool call of this response has been requested by now
+                        tool_calls = tool_calls_by_response.pop(
+                            response.get("response", {}).get("id"), None
+                        )
+                        if tool_calls:
+                            start_task(respond_after_tools(tool_calls))
 
-                    if response["type"] == "response.audio.delta" and response.get(
-                        "delta"
-                    ):
-                        try:
-                            audio_payload = base64.b64encode(
-                                base64.b64decode(response["delta"])
-                            ).decode("utf-8")
-                            audio_delta = {
-                                "event": "media",
-                                "streamSid": stream_sid,
-                                "media": {"payload": audio_payload},
-                            }
-                            await websocket.send_json(audio_delta)
-                        except Exception as e:
-                            print(f"Error processing audio data: {e}")
             except Exception as e:
                 print(f"Error in send_to_twilio: {e}")
 
-        await asyncio.gather(receive_from_twilio(), send_to_twilio())
-
-
-async def send_session_update(openai_ws):
-    session_update = {
-        "type": "session.update",
-        "session": {
-            "turn_detection": {"type": "server_vad"},
-            "input_audio_format": "g711_ulaw",
-            "output_audio_format": "g711_ulaw",
-            "voice": VOICE,
-            "instructions": SYSTEM_MESSAGE,
-            "modalities": ["text", "audio"],
-            "temperature": 0.8,
-            "tools": function_definitions,
-            "tool_choice": "auto",
-        },
-    }
-    print(f"Sending session update...")
-    await openai_ws.send(json.dumps(session_update))
+        async def pace_audio():
+            try:
+                await outbound.run()
+            except WebSocketDisconnect:
+                pass
+            except Exception as e:
+                print(f"Error in pace_audio: {e}")
+
+        pacer = asyncio.create_task(pace_audio())
+        try:
+            await asyncio.gather(receive_from_twilio(), send_to_twilio())
+        finally:
+            pacer.cancel()
+            for task in tool_tasks:
+                task.cancel()
+            outbound_underruns.inc(outbound.underruns)
+            outbound_overruns.inc(outbound.overruns)
@@ -0,0 +1,244 @@
+"""
+Realtime session gateway: pre-warmed OpenAI realtime sessions for incoming calls.
+
+Opening a realtime session costs a TLS + websocket handshake and a
+session.update round trip, which the caller would hear as dead air. The pool
+keeps a few sessions connected and configured ahead of time and hands one
+to each call. A background task refills it, sized from the recent call rate.
+Sessions are never reused: each one carries its own conversation, so a call
+closes its session when it ends.
+"""
+
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+import websockets
+from dotenv import load_dotenv
+from fastapi import FastAPI, WebSocket
+from websockets.protocol import State as ConnectionState
+
+from apps.twilio_restaurants.relay import dumps, loads
+from logic.realtime_api_openai.reservations_agent.simple_websocket import (
+    function_definitions,
+)
+
+load_dotenv()
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_REALTIME_URL = os.getenv(
+    "OPENAI_REALTIME_URL",
+    "wss://api.openai.com/v1/realtime?model=gpt-4o-realtime-preview-2024-12-17",
+)
+SYSTEM_MESSAGE = (
+    "You are an agent who makes restaurant reservations."
+    "To make a reservation, you need to collect the following required information: name of the party, date, time, and the size of the party."
+    "All these fields are required"
+    "You should talk like a restaurant front desk assistant gathering this information in a friendly, professional manner."
+    "Before finalizing any reservation, you must restate all the reservation details to the user and ask for confirmation."
+    "Only when the user confirms all details should you make the reservation by calling the make_reservation function."
+    "You have a bunch of tools at your disposal. When the user asks you about popular dishes or what's good in the restaurant, only stick to details returned from function call."
+    "Don't make up names of dishes, prices, or anything else that's not returned to you from the function."
+)
+VOICE = "alloy"
+
+# Pool settings; REALTIME_POOL_MAX_SIZE=0 turns pre-warming off
+POOL_MIN_SIZE = int(os.getenv("REALTIME_POOL_MIN_SIZE", "1"))
+POOL_MAX_SIZE = int(os.getenv("REALTIME_POOL_MAX_SIZE", "8"))
+# Calls seen over this many seconds set the pool size
+POOL_RATE_WINDOW = float(os.getenv("REALTIME_POOL_RATE_WINDOW", "60"))
+# Headroom for bursts, in standard deviations of the (Poisson) call arrivals
+POOL_BURST_STDDEVS = float(os.getenv("REALTIME_POOL_BURST_STDDEVS", "2"))
+# Idle sessions are replaced well before the API's 30 minute session limit
+POOL_MAX_IDLE = float(os.getenv("REALTIME_POOL_MAX_IDLE", "600"))
+POOL_CHECK_INTERVAL = float(os.getenv("REALTIME_POOL_CHECK_INTERVAL", "5"))
+POOL_RETRY_DELAY = float(os.getenv("REALTIME_POOL_RETRY_DELAY", "5"))
+SESSION_UPDATE_TIMEOUT = float(os.getenv("REALTIME_SESSION_UPDATE_TIMEOUT", "10"))
+
+
+async def send_session_update(openai_ws):
+    session_update = {
+        "type": "session.update",
+        "session": {
+            "turn_detection": {"type": "server_vad"},
+            "input_audio_format": "g711_ulaw",
+            "output_audio_format": "g711_ulaw",
+            "voice": VOICE,
+            "instructions": SYSTEM_MESSAGE,
+            "modalities": ["text", "audio"],
+            "temperature": 0.8,
+            "tools": function_definitions,
+            "tool_choice": "auto",
+        },
+    }
+    print(f"Sending session update...")
+    await openai_ws.send(dumps(session_update))
+
+
+async def open_realtime_session(wait_until_configured=False):
+    """
+    Connect to the realtime API and configure the session.
+
+    Pre-warmed sessions wait for session.updated so they are ready the moment
+    a call takes them; a call that has to open its own session doesn't wait.
+    """
+    openai_ws = await websockets.connect(
+        OPENAI_REALTIME_URL,
+        additional_headers={
+            "Authorization": f"Bearer {OPENAI_API_KEY}",
+            "OpenAI-Beta": "realtime=v1",
+        },
+    )
+    try:
+        await send_session_update(openai_ws)
+        if wait_until_configured:
+            async with asyncio.timeout(SESSION_UPDATE_TIMEOUT):
+                async for message in openai_ws:
+                    if loads(message)["type"] == "session.updated":
+                        break
+    except BaseException:
+        await openai_ws.close()
+        raise
+    return openai_ws
+
+
+class RealtimeSessionPool:
+    """
+    Pre-connected, pre-configured realtime sessions.
+
+    `connect(wait_until_configured)` opens one session. The pool aims to hold
+    enough sessions to cover the calls expected while replacements are still
+    connecting (call rate x connect time), plus `burst_stddevs` standard
+    deviations of headroom, clamped to [min_size, max_size].
+    """
+
+    def __init__(
+        self,
+        connect,
+        min_size=POOL_MIN_SIZE,
+        max_size=POOL_MAX_SIZE,
+        rate_window=POOL_RATE_WINDOW,
+        burst_stddevs=POOL_BURST_STDDEVS,
+        max_idle=POOL_MAX_IDLE,
+    ):
+        self._connect = connect
+        self.min_size = min(min_size, max_size)
+        self.max_size = max_size
+        self.rate_window = rate_window
+        self.burst_stddevs = burst_stddevs
+        self.max_idle = max_idle
+        # (session, ready_at), oldest first
+        self._ready = deque()
+        self._connecting = set()
+        # Sessions found unusable on acquire, closed by the refill task
+        self._stale = []
+        self._calls = deque()
+        self._started = time.monotonic()
+        # Running average of how long opening a session takes
+        self._connect_seconds = 1.0
+        self._wake = asyncio.Event()
+        self._refiller = None
+        self.hits = 0
+        self.misses = 0
+
+    def target_size(self):
+        now = time.monotonic()
+        while self._calls and now - self._calls[0] > self.rate_window:
+            self._calls.popleft()
+        # Until a full window has passed, average over the time so far
+        span = max(1.0, min(self.rate_window, now - self._started))
+        call_rate = len(self._calls) / span
+        expected = call_rate * self._connect_seconds
+        target = math.ceil(expected + self.burst_stddevs * math.sqrt(expected))
+        return max(self.min_size, min(self.max_size, target))
+
+    def start(self):
+        self._started = time.monotonic()
+        if self.max_size > 0:
+            self._refiller = asyncio.create_task(self._refill())
+
+    async def acquire(self):
+        """
+        A configured session for a new call; the caller owns and closes it
+        """
+        self._calls.append(time.monotonic())
+        self._wake.set()
+        while self._ready:
+            session, ready_at = self._ready.popleft()
+            if self._usable(session, ready_at):
+                self.hits += 1
+                return session
+            self._stale.append(session)
+        self.misses += 1
+        return await self._connect(wait_until_configured=False)
+
+    async def close(self):
+        tasks = [self._refiller, *self._connecting] if self._refiller else []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        while self._ready:
+            session, _ = self._ready.popleft()
+            await session.close()
+
+    def _usable(self, session, ready_at):
+        return (
+            session.state == ConnectionState.OPEN
+            and time.monotonic() - ready_at < self.max_idle
+        )
+
+    async def _refill(self):
+        while True:
+            # Drop sessions that closed or idled too long, and trim any the
+            # current call rate no longer needs
+            target = self.target_size()
+            kept = deque(item for item in self._ready if self._usable(*item))
+            stale = [item[0] for item in self._ready if item not in kept]
+            stale.extend(self._stale)
+            self._stale = []
+            while len(kept) > target:
+                stale.append(kept.popleft()[0])
+            self._ready = kept
+            for session in stale:
+                await session.close()
+
+            for _ in range(target - len(self._ready) - len(self._connecting)):
+                task = asyncio.create_task(self._warm_one())
+                self._connecting.add(task)
+                task.add_done_callback(self._connecting.discard)
+
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), POOL_CHECK_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _warm_one(self):
+        start_time = time.monotonic()
+        try:
+            session = await self._connect(wait_until_configured=True)
+        except Exception as e:
+            print(f"Error pre-warming realtime session: {e}")
+            # Stay in _connecting for a while so a failing upstream isn't hammered
+            await asyncio.sleep(POOL_RETRY_DELAY)
+            return
+        elapsed = time.monotonic() - start_time
+        self._connect_seconds = 0.8 * self._connect_seconds + 0.2 * elapsed
+        self._ready.append((session, time.monotonic()))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.realtime_sessions = RealtimeSessionPool(open_realtime_session)
+    app.state.realtime_sessions.start()
+    try:
+        yield
+    finally:
+        await app.state.realtime_sessions.close()
+
+
+def get_realtime_sessions(websocket: WebSocket):
+    return websocket.app.state.realtime_sessions
@@ -0,0 +1,257 @@
+"""
+Consumer throughput benchmark against an in-memory Kafka stand-in and a fake LLM.
+
+Compares the one-message-at-a-time poll loop with the batched, concurrent
+consumer. No Kafka, Redis or OpenAI access is needed.
+
+Usage:
+    python -m logic.llm_processing_async_kafka.benchmark_consumer --messages 500 --llm-latency 0.05
+"""
+
+import argparse
+import json
+import threading
+import time
+import uuid
+
+from logic.llm_processing_async_kafka import consumer_script
+from logic.llm_processing_async_kafka.publisher import Publisher
+from logic.llm_processing_async_kafka.rate_limit import (
+    AdaptiveConcurrency,
+)
+
+
+class FakeMessage:
+    def __init__(self, topic, partition, offset, key, value):
+        self._topic = topic
+        self._partition = partition
+        self._offset = offset
+        self._key = key
+        self._value = value
+
+    def topic(self):
+        return self._topic
+
+    def partition(self):
+        return self._partition
+
+    def offset(self):
+        return self._offset
+
+    def key(self):
+        return self._key
+
+    def value(self):
+        return self._value
+
+    def headers(self):
+        return None
+
+    def error(self):
+        return None
+
+
+class FakeConsumer:
+    """
+    In-memory stand-in for confluent_kafka.Consumer serving a fixed backlog
+    """
+
+    backlog = []
+    stop_event = None
+
+    def __init__(self, config):
+        self.config = config
+        self.position = 0
+        self.committed = {}
+
+    def subscribe(self, topics, on_assign=None, on_revoke=None):
+        self.topics = topics
+
+    def _next(self, count):
+        messages = FakeConsumer.backlog[self.position : self.position + count]
+        self.position += len(messages)
+        if not messages and FakeConsumer.stop_event is not None:
+            FakeConsumer.stop_event.set()
+        return messages
+
+    def poll(self, timeout=None):
+        messages = self._next(1)
+        if not messages:
+            # Mirror the real loop ending when the backlog is drained
+            raise KeyboardInterrupt
+        return messages[0]
+
+    def consume(self, num_messages=1, timeout=-1):
+        return self._next(num_messages)
+
+    def commit(self, message=None, offsets=None, asynchronous=True):
+        for tp in offsets or []:
+            self.committed[(tp.topic, tp.partition)] = tp.offset
+
+    def close(self):
+        pass
+
+
+class FakeProducer:
+    def __init__(self, config=None):
+        self.produced = 0
+        self._lock = threading.Lock()
+
+    def produce(self, topic, key=None, value=None, callback=None, **kwargs):
+        with self._lock:
+            self.produced += 1
+
+    def poll(self, timeout=0):
+        time.sleep(timeout)
+        return 0
+
+    def flush(self, timeout=None):
+        return 0
+
+    def __len__(self):
+        return 0
+
+
+class FakeRedis:
+    def __init__(self):
+        self.lists = {}
+        self._lock = threading.Lock()
+
+    def ping(self):
+        return True
+
+    def lpush(self, key, *values):
+        with self._lock:
+            self.lists.setdefault(key, [])[:0] = reversed(values)
+            return len(self.lists[key])
+
+    def lrange(self, key, start, end):
+        with self._lock:
+            return self.lists.get(key, [])[start : end + 1]
+
+    def ltrim(self, key, start, end):
+        with self._lock:
+            self.lists[key] = self.lists.get(key, [])[start : end + 1]
+
+    def expire(self, key, seconds):
+        return True
+
+    def publish(self, channel, message):
+        return 0
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.commands.append((name, args))
+
+    def execute(self):
+        return [getattr(self.client, name)(*args) for name, args in self.commands]
+
+
+class NoRateLimit:
+    def acquire(self, tokens):
+        return 0.0
+
+
+class FakeResponse:
+    def __init__(self, content):
+        self.content = content
+
+
+class FakeLLM:
+    model_name = "gpt-3.5-turbo"
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def invoke(self, messages):
+        time.sleep(self.latency)
+        return FakeResponse(f"answer to: {messages[-1][1]}")
+
+
+def make_backlog(topic, count, partitions, conversations):
+    conversation_ids = [str(uuid.uuid4()) for _ in range(conversations)]
+    backlog = []
+    for i in range(count):
+        conversation_id = conversation_ids[i % conversations]
+        value = json.dumps({"conversation_id": conversation_id, "prompt": f"q{i}"})
+        partition = i % partitions
+        backlog.append(
+            FakeMessage(
+                topic,
+                partition,
+                i // partitions,
+                conversation_id.encode(),
+                value.encode(),
+            )
+        )
+    return backlog
+
+
+def run(name, consume, count):
+    FakeConsumer.stop_event = threading.Event()
+    start = time.perf_counter()
+    consume(FakeConsumer.stop_event)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:<22} {count} msgs in {elapsed:7.2f}s -> {count / elapsed:8.1f} msgs/sec"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--partitions", type=int, default=4)
+    parser.add_argument(
+        "--conversations",
+        type=int,
+        default=100,
+        help="Distinct conversation keys; messages within one are processed in order",
+    )
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--max-in-flight", type=int, default=32)
+    parser.add_argument("--skip-serial", action="store_true")
+    args = parser.parse_args()
+
+    topic = "async_user_prompt"
+    FakeConsumer.backlog = make_backlog(
+        topic, args.messages, args.partitions, args.conversations
+    )
+    consumer_script.Consumer = FakeConsumer
+    consumer_script.publisher = Publisher(producer=FakeProducer())
+    consumer_script.llm = FakeLLM(args.llm_latency)
+    consumer_script.connect_to_redis = lambda connection_pool=None: FakeRedis()
+    consumer_script.rate_limiter = NoRateLimit()
+    consumer_script.llm_concurrency = AdaptiveConcurrency(
+        max_limit=args.max_in_flight, initial=args.max_in_flight
+    )
+    consumer_script.logger.setLevel("WARNING")
+
+    if not args.skip_serial:
+        run(
+            "serial poll loop",
+            lambda stop: consumer_script.consume_messages(topic),
+            args.messages,
+        )
+    run(
+        f"batched x{args.max_in_flight}",
+        lambda stop: consumer_script.consume_messages_batched(
+            topic,
+            batch_size=args.batch_size,
+            max_in_flight=args.max_in_flight,
+            stop_event=stop,
+        ),
+        args.messages,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Startup benchmark for the async LLM pipeline scripts.
+
+Starts each script's entry path in a fresh interpreter and reports the time
+until its first message is produced (or its consumer is subscribed), peak RSS,
+and whether langchain was imported along the way. Messages are only enqueued
+in librdkafka, so no Kafka, Redis or OpenAI access is needed.
+
+Usage:
+    python -m logic.llm_processing_async_kafka.benchmark_startup --runs 5 --max-seconds 1.5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Each snippet runs in its own interpreter and ends by printing a JSON report
+REPORT = """
+import json, resource, sys
+print(json.dumps({
+    "import_seconds": imported_at - started_at,
+    "ready_seconds": time.perf_counter() - started_at,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "langchain_loaded": any(name.startswith("langchain") for name in sys.modules),
+}), flush=True)
+"""
+
+SCENARIOS = {
+    "producer first produce": """
+import time
+started_at = time.perf_counter()
+from logic.llm_processing_async_kafka import producer_script
+imported_at = time.perf_counter()
+publisher = producer_script.Publisher(producer_script.settings.producer_config())
+producer_script.publish_message(
+    publisher,
+    "startup_benchmark",
+    producer_script.create_llm_message("ping", "startup-benchmark"),
+)
+""",
+    "consumer subscribe": """
+import time
+started_at = time.perf_counter()
+from logic.llm_processing_async_kafka import consumer_script
+imported_at = time.perf_counter()
+consumer = consumer_script.Consumer(consumer_script.settings.consumer_config())
+consumer.subscribe(["startup_benchmark"])
+""",
+}
+
+
+def run_once(snippet):
+    """
+    Run one scenario in a new interpreter; returns its report and the wall time including interpreter start
+    """
+    env = {**os.environ, "PYTHONPATH": os.getcwd()}
+    # Skip the Kafka shutdown flush: there is no broker to deliver to
+    code = snippet + REPORT + "import os; os._exit(0)\n"
+    start_time = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+        check=True,
+    )
+    wall_seconds = time.perf_counter() - start_time
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report["wall_seconds"] = wall_seconds
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--max-seconds",
+        type=float,
+        default=None,
+        help="Fail if a scenario's median wall time exceeds this",
+    )
+    parser.add_argument(
+        "--max-rss-mb",
+        type=float,
+        default=None,
+        help="Fail if a scenario's peak RSS exceeds this",
+    )
+    args = parser.parse_args()
+
+    print(
+        f"{'scenario':24} {'import':>8} {'ready':>8} {'wall':>8} {'rss':>9}  langchain"
+    )
+    failures = []
+    for name, snippet in SCENARIOS.items():
+        reports = [run_once(snippet) for _ in range(args.runs)]
+        import_seconds = statistics.median(r["import_seconds"] for r in reports)
+        ready_seconds = statistics.median(r["ready_seconds"] for r in reports)
+        wall_seconds = statistics.median(r["wall_seconds"] for r in reports)
+        max_rss_mb = max(r["max_rss_mb"] for r in reports)
+        langchain_loaded = any(r["langchain_loaded"] for r in reports)
+        print(
+            f"{name:24} {import_seconds:7.3f}s {ready_seconds:7.3f}s {wall_seconds:7.3f}s "
+            f"{max_rss_mb:6.1f} MB  {'yes' if langchain_loaded else 'no'}"
+        )
+
+        if args.max_seconds is not None and wall_seconds > args.max_seconds:
+            failures.append(f"{name}: {wall_seconds:.3f}s > {args.max_seconds}s")
+        if args.max_rss_mb is not None and max_rss_mb > args.max_rss_mb:
+            failures.append(f"{name}: {max_rss_mb:.1f} MB > {args.max_rss_mb} MB")
+        if langchain_loaded:
+            failures.append(f"{name}: langchain imported at startup")
+
+    if failures:
+        print("Startup regressions:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,50 +1,259 @@
-import redis
-from confluent_kafka import Producer, KafkaException
-from confluent_kafka.admin import AdminClient, NewTopic
+"""
+Shared Kafka and Redis settings for the async LLM pipeline.
+
+Every script imports `settings` from here, so one change applies to the
+producer, the consumers and the tooling alike. PIPELINE_PROFILE selects a
+named performance profile ("high-throughput" by default, or "low-latency");
+individual values can still be overridden from the environment, including
+any librdkafka property via KAFKA_PRODUCER_<NAME> / KAFKA_CONSUMER_<NAME>
+(e.g. KAFKA_PRODUCER_LINGER_MS=5 sets linger.ms).
+"""
+
 import logging
+import os
 import sys
+from dataclasses import dataclass, field, replace
+from typing import Optional
+
+import redis
+from confluent_kafka import KafkaException
+from confluent_kafka.admin import AdminClient, NewPartitions, NewTopic
+from dotenv import load_dotenv
+
+# Load environment variables before any setting is read
+load_dotenv()
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
 logger = logging.getLogger(__name__)
 
-kafka_topic_name = "async_llm_response"
 
-# Kafka Producer configuration
-kafka_producer_config = {
-    "bootstrap.servers": "localhost:29092",
-    "client.id": "python-producer",
-    "socket.timeout.ms": 10000,  # Increase timeout for troubleshooting
-    "request.timeout.ms": 20000,
-}
+@dataclass(frozen=True)
+class Profile:
+    """
+    librdkafka and batching settings tuned for one performance goal
+    """
 
-# Kafka Consumer configuration
-kafka_consumer_config = {
-    "bootstrap.servers": "localhost:29092",
-    "group.id": "llm-processor-group",  # Required setting for Consumer - was missing
-    "auto.offset.reset": "earliest",  # Start from the beginning if no offset is stored
-    "socket.timeout.ms": 10000,  # Increase timeout for troubleshooting
-    "request.timeout.ms": 20000,
+    name: str
+    producer: dict
+    consumer: dict
+    batch_size: int
+    batch_timeout: float
+    max_in_flight: int
+
+
+PROFILES = {
+    # Batch and compress on the way in, fetch in large chunks on the way out
+    "high-throughput": Profile(
+        name="high-throughput",
+        producer={
+            "linger.ms": 20,  # Wait up to 20ms to fill a batch
+            "batch.size": 262144,  # Max bytes per partition batch
+            "batch.num.messages": 10000,
+            "compression.type": "zstd",
+            "queue.buffering.max.messages": 500000,
+            "queue.buffering.max.kbytes": 1048576,
+        },
+        consumer={
+            "fetch.min.bytes": 65536,
+            "fetch.wait.max.ms": 100,
+            "max.partition.fetch.bytes": 4194304,
+        },
+        batch_size=64,
+        batch_timeout=1.0,
+        max_in_flight=16,
+    ),
+    # Send and fetch each message as soon as it exists
+    "low-latency": Profile(
+        name="low-latency",
+        producer={
+            "linger.ms": 0,
+            "compression.type": "none",
+        },
+        consumer={
+            "fetch.min.bytes": 1,
+            "fetch.wait.max.ms": 10,
+        },
+        batch_size=8,
+        batch_timeout=0.05,
+        max_in_flight=16,
+    ),
 }
 
-# Redis configuration based on your Docker settings
-redis_config = {
-    "host": "localhost",
-    "port": 6379,
-    "password": "docker",
-    "db": 0,
-    "decode_responses": True,  # Automatically decode response bytes to strings
+# Durability settings every profile keeps
+reliable_producer_config = {
+    "acks": "all",
+    "enable.idempotence": True,  # Safe retries without duplicates or reordering
 }
 
 
-def connect_to_redis():
+@dataclass(frozen=True)
+class KafkaSettings:
+    bootstrap_servers: str = "localhost:29092"
+    group_id: str = "llm-processor-group"
+    socket_timeout_ms: int = 10000
+    request_timeout_ms: int = 20000
+    prompt_topic: str = "async_user_prompt"
+    response_topic: str = "async_llm_response"
+    # Partitions bound consumer parallelism: one consumer process per partition at most
+    topic_partitions: int = 12
+    # librdkafka properties set from the environment, applied on top of the profile
+    producer_overrides: dict = field(default_factory=dict)
+    consumer_overrides: dict = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class RedisSettings:
+    host: str = "localhost"
+    port: int = 6379
+    password: Optional[str] = "docker"
+    db: int = 0
+
+
+@dataclass(frozen=True)
+class Settings:
+    kafka: KafkaSettings
+    redis: RedisSettings
+    profile: Profile
+
+    def client_config(self):
+        """
+        Connection settings shared by producers, consumers and admin clients
+        """
+        return {
+            "bootstrap.servers": self.kafka.bootstrap_servers,
+            "socket.timeout.ms": self.kafka.socket_timeout_ms,
+        }
+
+    def producer_config(self, client_id="python-producer"):
+        return {
+            **self.client_config(),
+            "client.id": client_id,
+            "request.timeout.ms": self.kafka.request_timeout_ms,
+            **reliable_producer_config,
+            **self.profile.producer,
+            **self.kafka.producer_overrides,
+        }
+
+    def consumer_config(self, group_id=None, overrides=None):
+        return {
+            **self.client_config(),
+            "group.id": group_id or self.kafka.group_id,
+            "auto.offset.reset": "earliest",  # Start from the beginning if no offset is stored
+            **self.profile.consumer,
+            **self.kafka.consumer_overrides,
+            **(overrides or {}),
+        }
+
+    def redis_config(self):
+        return {
+            "host": self.redis.host,
+            "port": self.redis.port,
+            "password": self.redis.password,
+            "db": self.redis.db,
+            "decode_responses": True,  # Automatically decode response bytes to strings
+        }
+
+
+def _coerce(value):
+    """
+    Pass numbers and booleans from the environment to librdkafka as their own types
+    """
+    if value.lower() in ("true", "false"):
+        return value.lower() == "true"
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
+def _librdkafka_overrides(prefix):
+    return {
+        name[len(prefix) :].lower().replace("_", "."): _coerce(value)
+        for name, value in os.environ.items()
+        if name.startswith(prefix)
+    }
+
+
+def load_settings(profile_name=None):
+    """
+    Build settings from a named profile plus environment overrides
+    """
+    profile_name = profile_name or os.getenv("PIPELINE_PROFILE", "high-throughput")
+    try:
+        profile = PROFILES[profile_name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown pipeline profile {profile_name!r}, expected one of {sorted(PROFILES)}"
+        )
+    profile = replace(
+        profile,
+        batch_size=int(os.getenv("CONSUMER_BATCH_SIZE", profile.batch_size)),
+        batch_timeout=float(os.getenv("CONSUMER_BATCH_TIMEOUT", profile.batch_timeout)),
+        max_in_flight=int(os.getenv("CONSUMER_MAX_IN_FLIGHT", profile.max_in_flight)),
+    )
+
+    defaults = KafkaSettings()
+    kafka = KafkaSettings(
+        bootstrap_servers=os.getenv(
+            "KAFKA_BOOTSTRAP_SERVERS", defaults.bootstrap_servers
+        ),
+        group_id=os.getenv("KAFKA_GROUP_ID", defaults.group_id),
+        socket_timeout_ms=int(
+            os.getenv("KAFKA_SOCKET_TIMEOUT_MS", defaults.socket_timeout_ms)
+        ),
+        request_timeout_ms=int(
+            os.getenv("KAFKA_REQUEST_TIMEOUT_MS", defaults.request_timeout_ms)
+        ),
+        prompt_topic=os.getenv("KAFKA_PROMPT_TOPIC", defaults.prompt_topic),
+        response_topic=os.getenv("KAFKA_RESPONSE_TOPIC", defaults.response_topic),
+        topic_partitions=int(
+            os.getenv("KAFKA_TOPIC_PARTITIONS", defaults.topic_partitions)
+        ),
+        producer_overrides=_librdkafka_overrides("KAFKA_PRODUCER_"),
+        consumer_overrides=_librdkafka_overrides("KAFKA_CONSUMER_"),
+    )
+
+    redis_defaults = RedisSettings()
+    redis_settings = RedisSettings(
+        host=os.getenv("REDIS_HOST", redis_defaults.host),
+        port=int(os.getenv("REDIS_PORT", redis_defaults.port)),
+        password=os.getenv("REDIS_PASSWORD", redis_defaults.password),
+        db=int(os.getenv("REDIS_DB", redis_defaults.db)),
+    )
+
+    return Settings(kafka=kafka, redis=redis_settings, profile=profile)
+
+
+settings = load_settings()
+
+
+def retry_topic_for(topic_name):
+    return f"{topic_name}.retry"
+
+
+def dead_letter_topic_for(topic_name):
+    return f"{topic_name}.dlq"
+
+
+def create_redis_pool(max_connections, timeout=10):
+    """
+    Bounded connection pool; callers block for up to `timeout` seconds when it is exhausted
+    """
+    return redis.BlockingConnectionPool(
+        **settings.redis_config(), max_connections=max_connections, timeout=timeout
+    )
+
+
+def connect_to_redis(connection_pool=None):
     """
     Connect to Redis instance
     """
     try:
-        client = redis.Redis(**redis_config)
+        if connection_pool is not None:
+            client = redis.Redis(connection_pool=connection_pool)
+        else:
+            client = redis.Redis(**settings.redis_config())
         # Test connection
         client.ping()
         logger.info("Connected to Redis successfully")
@@ -54,16 +263,36 @@ def connect_to_redis():
         raise
 
 
-def create_topic(topic_name, num_partitions=1, replication_factor=1):
+def create_topic(
+    topic_name,
+    num_partitions=settings.kafka.topic_partitions,
+    replication_factor=1,
+    grow=False,
+):
     """
-    Create a Kafka topic if it doesn't exist
+    Create a Kafka topic if it doesn't exist.
+
+    An existing topic keeps its partition count unless grow is set, since
+    adding partitions re-hashes keys and breaks per-conversation ordering
+    (see add_partitions).
     """
-    admin_client = AdminClient(kafka_producer_config)
+    admin_client = AdminClient(settings.client_config())
 
     # Check if topic already exists
     metadata = admin_client.list_topics(timeout=10)
     if topic_name in metadata.topics:
-        logger.info(f"Topic {topic_name} already exists")
+        current_partitions = len(metadata.topics[topic_name].partitions)
+        if current_partitions < num_partitions and grow:
+            add_partitions(admin_client, topic_name, num_partitions)
+        elif current_partitions < num_partitions:
+            logger.warning(
+                f"Topic {topic_name} has {current_partitions} partitions, fewer than "
+                f"the configured {num_partitions}; not growing it without --grow-partitions"
+            )
+        else:
+            logger.info(
+                f"Topic {topic_name} already exists with {current_partitions} partitions"
+            )
         return
 
     # Create topic
@@ -83,32 +312,22 @@ def create_topic(topic_name, num_partitions=1, replication_factor=1):
         sys.exit(1)
 
 
-def create_topic(topic_name, num_partitions=1, replication_factor=1):
-    """
-    Create a Kafka topic if it doesn't exist
+def add_partitions(admin_client, topic_name, num_partitions):
     """
-    admin_client = AdminClient(kafka_producer_config)
-
-    # Check if topic already exists
-    metadata = admin_client.list_topics(timeout=10)
-    if topic_name in metadata.topics:
-        logger.info(f"Topic {topic_name} already exists")
-        return
-
-    # Create topic
-    topic = NewTopic(
-        topic_name, num_partitions=num_partitions, replication_factor=replication_factor
-    )
+    Increase a topic's partition count so more consumer processes can share the load.
 
+    Keys are re-hashed over the new partition count, so only grow topics while
+    no conversation has messages in flight if strict ordering matters.
+    """
     try:
-        futures = admin_client.create_topics([topic])
-
-        # Wait for topic creation
+        futures = admin_client.create_partitions(
+            [NewPartitions(topic_name, num_partitions)]
+        )
         for topic_name, future in futures.items():
-            future.result()  # Blocks until topic is created
-            logger.info(f"Topic {topic_name} created successfully")
+            future.result()
+            logger.info(f"Topic {topic_name} now has {num_partitions} partitions")
     except KafkaException as e:
-        logger.error(f"Failed to create topic {topic_name}: {e}")
+        logger.error(f"Failed to add partitions to {topic_name}: {e}")
         sys.exit(1)
 
 def delivery_report(err, msg):
@@ -1,67 +1,160 @@
 import json
 import logging
+import multiprocessing
+import threading
+import time
+import openai
 import redis
-from confluent_kafka import Consumer, KafkaError, KafkaException, Producer
-from langchain_openai import ChatOpenAI
-from langchain.schema import HumanMessage
+from concurrent.futures import ThreadPoolExecutor
+from confluent_kafka import (
+    Consumer,
+    KafkaError,
+    KafkaException,
+    TopicPartition,
+)
 from dotenv import load_dotenv
 import os
 
+from logic.llm_processing_async_kafka.configs import (
+    connect_to_redis,
+    create_redis_pool,
+    settings,
+)
+from logic.llm_processing_async_kafka.history import (
+    ConversationCache,
+    HistoryWriter,
+    conversation_key,
+    encode_prompt_status,
+    encode_turn,
+    pack_context,
+)
+from logic.llm_processing_async_kafka.tokens import count_message_tokens
+from logic.llm_processing_async_kafka.tracing import StageTimer
+from logic.llm_processing_async_kafka.publisher import Publisher
+from logic.llm_processing_async_kafka.rate_limit import (
+    AdaptiveConcurrency,
+    RedisRateLimiter,
+    completion_token_estimate,
+)
+from logic.llm_processing_async_kafka.retries import (
+    call_with_retries,
+    relay_retries,
+    retry_topic_for,
+    route_failure,
+)
+from logic.singleflight import SingleFlight
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 )
 logger = logging.getLogger(__name__)
 
-# Kafka configuration
-kafka_config = {
-    "bootstrap.servers": "localhost:29092",
-    "group.id": "llm-processor-group",  # Required setting for Consumer - was missing
-    "auto.offset.reset": "earliest",  # Start from the beginning if no offset is stored
-    "socket.timeout.ms": 10000,  # Increase timeout for troubleshooting
-    "request.timeout.ms": 20000,
-}
-
-# Redis configuration based on your Docker settings
-redis_config = {
-    "host": "localhost",
-    "port": 6379,
-    "password": "docker",
-    "db": 0,
-    "decode_responses": True,  # Automatically decode response bytes to strings
-}
+# Batched consumer settings come from the active pipeline profile
+batch_size = settings.profile.batch_size
+batch_timeout = settings.profile.batch_timeout
+max_in_flight = settings.profile.max_in_flight
+consumer_processes = int(os.getenv("CONSUMER_PROCESSES", "1"))
 
 # Load environment variables
 load_dotenv()
 
-# Initialize LLM
-llm = ChatOpenAI(
-    model="gpt-3.5-turbo", temperature=0.7, api_key=os.getenv("OPENAI_API_KEY")
-)
+# The LLM client is created on first use, so starting a consumer (or any tool
+# importing this module) doesn't pay for importing langchain
+llm_model = "gpt-3.5-turbo"
+llm = None
+_llm_lock = threading.Lock()
+
+# Non-blocking Kafka publisher, created by main() so importing this module
+# doesn't start a producer and its poll thread
+publisher = None
 
-# Initialize Kafka producer
-producer = Producer(kafka_config)
+# Identical prompts in flight at the same time share one LLM call
+llm_calls = SingleFlight()
 
+# One bounded connection pool shared by every worker thread in this process
+redis_pool = create_redis_pool(max_connections=max_in_flight + 4)
 
-def connect_to_redis():
+# Quota shared by every consumer process, and this process's adaptive share of it
+rate_limiter = RedisRateLimiter(redis.Redis(connection_pool=redis_pool))
+llm_concurrency = AdaptiveConcurrency(max_limit=max_in_flight)
+
+
+def get_llm():
+    global llm
+    if llm is None:
+        with _llm_lock:
+            if llm is None:
+                from langchain_openai import ChatOpenAI
+
+                # Retries are handled by call_with_retries and the retry topic, so the client itself doesn't retry
+                llm = ChatOpenAI(
+                    model=llm_model,
+                    temperature=0.7,
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    timeout=float(os.getenv("LLM_TIMEOUT", "60")),
+                    max_retries=0,
+                )
+    return llm
+
+
+def create_history_writer(redis_client):
     """
-    Connect to Redis instance
+    Pipelined history writer that keeps an in-process cache of recent conversation windows
     """
-    try:
-        client = redis.Redis(**redis_config)
-        # Test connection
-        client.ping()
-        logger.info("Connected to Redis successfully")
-        return client
-    except redis.RedisError as e:
-        logger.error(f"Failed to connect to Redis: {e}")
-        raise
+    return HistoryWriter(
+        redis_client,
+        conversation_cache=ConversationCache(redis_client, llm_model),
+    )
+
+
+def build_messages(conversation_cache, conversation_id, prompt):
+    """
+    Prepend as many recent turns of the conversation as fit in the context token budget.
+
+    Messages are (role, content) tuples, which the LLM accepts without building
+    langchain message objects.
+    """
+    messages = []
+    if conversation_cache is not None:
+        window = conversation_cache.get_window(conversation_id)
+        prompt_tokens = count_message_tokens((prompt,), llm_model)
+        for question, answer in pack_context(window, prompt_tokens):
+            messages.append(("human", question))
+            messages.append(("ai", answer))
+    messages.append(("human", prompt))
+    return messages
 
 
-def process_message(message, redis_client):
+def invoke_llm(messages):
     """
-    Process a Kafka message, call the LLM for an answer, store it in Redis, and publish the result back to Kafka
+    Call the LLM within the shared RPM/TPM quota and the adaptive concurrency limit
     """
+    estimated_tokens = (
+        count_message_tokens([content for _, content in messages], llm_model)
+        + completion_token_estimate
+    )
+    with llm_concurrency.slot():
+        rate_limiter.acquire(estimated_tokens)
+        start_time = time.perf_counter()
+        try:
+            response = get_llm().invoke(messages)
+        except openai.RateLimitError:
+            llm_concurrency.on_rate_limited()
+            raise
+        llm_concurrency.on_success(time.perf_counter() - start_time)
+        return response
+
+
+def process_message(message, history_writer, responses):
+    """
+    Process a Kafka message, call the LLM for an answer and queue it for Redis.
+
+    The response is added to `responses`, to be published by publish_responses
+    once the turn has been flushed to Redis.
+    """
+    timer = StageTimer(message)
+    conversation_id = message_id = None
     try:
         # Decode message value
         message_value = message.value().decode("utf-8")
@@ -73,45 +166,120 @@ def process_message(message, redis_client):
         # Get conversation ID (used as Redis key)
         conversation_id = payload.get("conversation_id")
         prompt = payload.get("prompt")
+        message_id = payload.get("message_id")
+        if conversation_id is None or prompt is None:
+            # Not transient, so this goes to the dead-letter topic, never the retry topic
+            raise ValueError("Message has no conversation_id or prompt")
 
-        # Call the LLM to get the answer
-        messages = [HumanMessage(content=prompt)]
-        response = llm.invoke(messages)
-        llm_answer = response.content
-
-        # Store the question and answer in Redis
-        cache_key = f"conversation:{conversation_id}"
-        redis_client.lpush(
-            cache_key,
-            json.dumps(
-                {
-                    "question": prompt,
-                    "answer": llm_answer,
-                }
-            ),
-        )
+        # A message delivered again after its turn was stored (a retry, or a
+        # batch rewound after a failed delivery) reuses the answer instead of
+        # calling the LLM and appending the turn a second time
+        llm_answer = None
+        if message_id is not None and history_writer.conversation_cache is not None:
+            llm_answer = history_writer.conversation_cache.find_answer(
+                conversation_id, message_id
+            )
+        if llm_answer is not None:
+            logger.info(f"Message {message_id} was already answered, republishing")
+        else:
+            # Call the LLM to get the answer
+            messages = build_messages(
+                history_writer.conversation_cache, conversation_id, prompt
+            )
+            timer.mark("context")
+            # Coalesce on the full prompt including context, not just the latest question
+            flight_key = tuple(messages)
+            response = llm_calls.do(
+                flight_key, lambda: call_with_retries(lambda: invoke_llm(messages))
+            )
+            llm_answer = response.content
+            timer.mark("llm")
 
-        logger.info(f"Stored message in Redis with key: {cache_key}")
-        logger.info(
-            f"Full payload stored in Redis: {json.dumps({'question': prompt, 'answer': llm_answer})}"
-        )
+            # Queue the question and answer for the next pipelined Redis write
+            encoded_turn = encode_turn(prompt, llm_answer, message_id)
+            history_writer.append(
+                conversation_id, encoded_turn, prompt, llm_answer, message_id
+            )
+            logger.debug(
+                f"Queued turn for {conversation_key(conversation_id)}: {encoded_turn}"
+            )
+            # Only the in-memory buffer; the Redis write is charged to redis_flush
+            timer.mark("history_buffer")
 
-        # Publish the payload back to Kafka
+        # The payload to publish back to Kafka
         kafka_payload = {
             "conversation_id": conversation_id,
+            "message_id": message_id,
             "user_prompt": prompt,
             "llm_response": llm_answer,
         }
-        producer.produce(
-            topic="async_llm_response",
-            key=conversation_id,
-            value=json.dumps(kafka_payload),
-            callback=lambda err, msg: logger.info(f"Message published successfully: {msg.topic()} [{msg.partition()}] at offset {msg.offset()} with payload: {json.dumps(kafka_payload)}" if err is None else f"Failed to publish message: {err}")
-        )
-        producer.flush()
+        responses.append((timer, conversation_id, json.dumps(kafka_payload)))
 
     except Exception as e:
         logger.error(f"Error processing message: {e}")
+        # Park the message on the retry or dead-letter topic instead of dropping it
+        try:
+            target_topic = route_failure(
+                publisher, message, e, source_topic=message.topic()
+            )
+        except Exception as routing_error:
+            logger.error(f"Failed to route failed message: {routing_error}")
+            return False
+        # Let HTTP pollers tell a failed prompt from a slow one
+        if message_id is not None:
+            status = (
+                "retrying"
+                if target_topic == retry_topic_for(message.topic())
+                else "failed"
+            )
+            history_writer.set_status(
+                conversation_id,
+                message_id,
+                encode_prompt_status(
+                    message_id, status, f"{type(e).__name__}: {e}"[:500]
+                ),
+            )
+        return False
+
+    return True
+
+
+def log_delivery(err, msg, timer, published_at):
+    """
+    Delivery callback for a response, logging its republish stage: the time
+    from publish to the broker's acknowledgement, including any wait on the
+    batch's Kafka flush. A response can't carry its own delivery time in its
+    headers, so this stage is only in the consumer log.
+    """
+    if err is not None:
+        logger.error(f"Failed to publish message: {err}")
+        return
+    stages = {**timer.stages, "republish": time.perf_counter() - published_at}
+    logger.info(
+        f"Message published successfully: {msg.topic()} [{msg.partition()}] at offset {msg.offset()}, "
+        f"trace {timer.trace_id} stages {json.dumps(stages, separators=(',', ':'))}"
+    )
+
+
+def publish_responses(responses):
+    """
+    Publish the responses of processed messages once their turns are in Redis.
+
+    Each message's redis_flush stage is its wait for the pipelined Redis
+    write, measured from the end of its own processing.
+    """
+    for timer, conversation_id, kafka_payload in responses:
+        timer.mark("redis_flush")
+        published_at = time.perf_counter()
+        publisher.publish(
+            topic=settings.kafka.response_topic,
+            key=conversation_id,
+            value=kafka_payload,
+            headers=timer.response_headers(),
+            callback=lambda err, msg, timer=timer, published_at=published_at: (
+                log_delivery(err, msg, timer, published_at)
+            ),
+        )
 
 
 def consume_messages(topic_name):
@@ -119,37 +287,296 @@ def consume_messages(topic_name):
     Consume messages from Kafka topic and store in Redis
     """
     # Connect to Redis
-    redis_client = connect_to_redis()
+    history_writer = create_history_writer(connect_to_redis(redis_pool))
 
     # Create consumer
-    consumer = Consumer(kafka_config)
+    consumer = Consumer(settings.consumer_config())
 
     try:
         # Subscribe to topic
         consumer.subscribe([topic_name])
         logger.info(f"Subscribed to topic: {topic_name}")
 
-        # Consume messages
+        # Consume messages. Responses wait until their history is in Redis; if a
+        # flush fails, both stay buffered and go out with the next one.
+        responses = []
         while True:
             message = consumer.poll(timeout=1.0)
             if message is None:
                 continue
 
-            process_message(message, redis_client)
+            process_message(message, history_writer, responses)
+            try:
+                history_writer.flush()
+            except redis.RedisError as e:
+                logger.error(f"Redis flush failed, retrying with the next message: {e}")
+                continue
+            publish_responses(responses)
+            responses = []
 
     except KeyboardInterrupt:
         logger.info("Consumer stopped by user")
     except Exception as e:
         logger.error(f"Unexpected error: {e}")
     finally:
-        # Close consumer
+        # Close consumer and deliver any queued responses
         consumer.close()
+        publisher.flush()
+
+
+def group_by_key(messages):
+    """
+    Group messages by Kafka key (conversation_id), keeping each group in offset order.
+
+    Unkeyed messages fall back to their partition so they stay in partition order.
+    """
+    groups = {}
+    for message in messages:
+        key = message.key() or (message.topic(), message.partition())
+        groups.setdefault(key, []).append(message)
+    return list(groups.values())
+
+
+def process_in_order(messages, history_writer, responses):
+    """
+    Process one conversation's messages sequentially
+    """
+    return [process_message(message, history_writer, responses) for message in messages]
 
 
-def main():
-    topic_name = "async_user_prompt"
-    consume_messages(topic_name)
+def dispatch_by_key(executor, messages, history_writer, responses):
+    """
+    Run different conversations in parallel while keeping each conversation in order
+    """
+    results = executor.map(
+        lambda group: process_in_order(group, history_writer, responses),
+        group_by_key(messages),
+    )
+    return [result for group_results in results for result in group_results]
+
+
+def log_assignment(consumer, partitions):
+    logger.info(f"Assigned partitions: {[(p.topic, p.partition) for p in partitions]}")
+
+
+def commit_offsets(consumer, messages):
+    """
+    Synchronously commit the next offset after the highest processed message of each partition
+    """
+    next_offsets = {}
+    for message in messages:
+        tp = (message.topic(), message.partition())
+        next_offsets[tp] = max(next_offsets.get(tp, 0), message.offset() + 1)
+
+    if next_offsets:
+        consumer.commit(
+            offsets=[
+                TopicPartition(topic, partition, offset)
+                for (topic, partition), offset in next_offsets.items()
+            ],
+            asynchronous=False,
+        )
+
+
+def rewind(consumer, messages):
+    """
+    Seek each partition back to the first message of the batch so it is consumed again
+    """
+    first_offsets = {}
+    for message in messages:
+        tp = (message.topic(), message.partition())
+        first_offsets[tp] = min(
+            first_offsets.get(tp, message.offset()), message.offset()
+        )
+
+    for (topic, partition), offset in first_offsets.items():
+        consumer.seek(TopicPartition(topic, partition, offset))
+
+
+def consume_messages_batched(
+    topic_name,
+    batch_size=batch_size,
+    batch_timeout=batch_timeout,
+    max_in_flight=max_in_flight,
+    stop_event=None,
+):
+    """
+    Consume messages in batches and process each batch concurrently on a thread pool.
+
+    Auto-commit is disabled: a batch's offsets are committed only after every
+    message in it has been written to Redis and every response, retry or
+    dead-letter message it produced has been delivered. If any delivery
+    failed the batch is rewound and processed again instead of committed, so
+    a crash or a Kafka outage re-delivers unfinished work instead of losing it.
+    """
+    # Connect to Redis
+    history_writer = create_history_writer(connect_to_redis(redis_pool))
+
+    # Create consumer with manual offset commits. Cooperative-sticky rebalancing only moves
+    # the partitions that change owner when consumer processes join or leave the group.
+    consumer = Consumer(
+        settings.consumer_config(
+            overrides={
+                "enable.auto.commit": False,
+                "partition.assignment.strategy": "cooperative-sticky",
+            }
+        )
+    )
+    executor = ThreadPoolExecutor(
+        max_workers=max_in_flight, thread_name_prefix="llm-worker"
+    )
+
+    processed = 0
+    failed = 0
+    start_time = time.perf_counter()
+    try:
+        # Subscribe to topic. Rebalance callbacks run inside consume(), after the
+        # previous batch has been committed, so no in-flight work is lost on revoke.
+        def on_assign(consumer, partitions):
+            log_assignment(consumer, partitions)
+            # Conversations may have been updated by another consumer while unassigned
+            history_writer.conversation_cache.clear()
+
+        consumer.subscribe([topic_name], on_assign=on_assign)
+        logger.info(
+            f"Subscribed to topic: {topic_name} (batch_size={batch_size}, max_in_flight={max_in_flight})"
+        )
+
+        while stop_event is None or not stop_event.is_set():
+            messages = consumer.consume(num_messages=batch_size, timeout=batch_timeout)
+            if not messages:
+                continue
+
+            batch = []
+            for message in messages:
+                if message.error():
+                    if message.error().code() != KafkaError._PARTITION_EOF:
+                        logger.error(f"Consumer error: {message.error()}")
+                    continue
+                batch.append(message)
+
+            batch_start = time.perf_counter()
+            responses = []
+            results = dispatch_by_key(executor, batch, history_writer, responses)
+            processed_at = time.perf_counter()
+            # Barrier: history and responses must be durable before offsets move on.
+            # Responses are published once their history is in Redis.
+            try:
+                history_writer.flush()
+            except redis.RedisError as e:
+                logger.error(
+                    f"Batch of {len(batch)} not fully written to Redis ({e}), "
+                    "rewinding instead of committing"
+                )
+                rewind(consumer, batch)
+                # Reprocessing rebuilds the turns, statuses and responses
+                history_writer.discard()
+                history_writer.conversation_cache.clear()
+                continue
+            redis_flushed_at = time.perf_counter()
+            publish_responses(responses)
+            delivered = publisher.barrier()
+            kafka_flushed_at = time.perf_counter()
+            if not delivered:
+                logger.error(
+                    f"Batch of {len(batch)} not fully delivered to Kafka, "
+                    "rewinding instead of committing"
+                )
+                rewind(consumer, batch)
+                # Windows may hold turns of the rewound messages; reload them from Redis
+                history_writer.conversation_cache.clear()
+                continue
+            commit_offsets(consumer, batch)
+            logger.info(
+                f"Batch of {len(batch)}: process {processed_at - batch_start:.3f}s, "
+                f"redis flush {redis_flushed_at - processed_at:.3f}s, "
+                f"kafka flush {kafka_flushed_at - redis_flushed_at:.3f}s, "
+                f"commit {time.perf_counter() - kafka_flushed_at:.3f}s"
+            )
+
+            processed += len(results)
+            failed += results.count(False)
+
+    except KeyboardInterrupt:
+        logger.info("Consumer stopped by user")
+    except Exception as e:
+        logger.error(f"Unexpected error: {e}")
+    finally:
+        executor.shutdown(wait=True)
+        consumer.close()
+        publisher.flush()
+        elapsed = time.perf_counter() - start_time
+        logger.info(
+            f"Processed {processed} messages ({failed} failed) in {elapsed:.2f}s "
+            f"({processed / elapsed if elapsed else 0:.1f} msgs/sec)"
+        )
+
+    return processed
+
+
+def consume_retries(topic_name, stop_event=None):
+    """
+    Relay messages from the retry topic back to the main topic once their backoff has elapsed
+    """
+    consumer = Consumer(
+        settings.consumer_config(
+            group_id=f"{settings.kafka.group_id}-retry",
+            overrides={"enable.auto.commit": False},
+        )
+    )
+    try:
+        consumer.subscribe([retry_topic_for(topic_name)])
+        logger.info(f"Relaying retries from: {retry_topic_for(topic_name)}")
+        relay_retries(consumer, publisher, stop_event=stop_event)
+    except KeyboardInterrupt:
+        logger.info("Retry relay stopped by user")
+    finally:
+        consumer.close()
+        publisher.flush()
+
+
+def run_consumer_processes(topic_name, num_processes=consumer_processes):
+    """
+    Run one batched consumer per process in the same consumer group.
+
+    Kafka spreads the topic's partitions across the processes, so throughput
+    scales with min(num_processes, partitions). Processes are spawned rather
+    than forked because librdkafka clients are not fork-safe.
+    """
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=main, args=(topic_name,), name=f"llm-consumer-{i}")
+        for i in range(num_processes)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        logger.info("Stopping consumer processes")
+        for process in processes:
+            process.join()
+
+
+def main(topic_name=None):
+    global publisher
+    publisher = Publisher(settings.producer_config(client_id="llm-processor-producer"))
+    topic_name = topic_name or settings.kafka.prompt_topic
+    consumer_mode = os.getenv("CONSUMER_MODE", "batched")
+    try:
+        if consumer_mode == "batched":
+            consume_messages_batched(topic_name)
+        elif consumer_mode == "retry_relay":
+            consume_retries(topic_name)
+        else:
+            consume_messages(topic_name)
+    finally:
+        publisher.close()
 
 
 if __name__ == "__main__":
-    main()
+    if consumer_processes > 1:
+        run_consumer_processes(settings.kafka.prompt_topic)
+    else:
+        main()
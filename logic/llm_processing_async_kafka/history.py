@@ -0,0 +1,257 @@
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from logic.llm_processing_async_kafka.tokens import count_message_tokens
+
+logger = logging.getLogger(__name__)
+
+# Conversation history settings: LTRIM cap per conversation, and TTL for idle ones (0 disables)
+history_max_turns = int(os.getenv("HISTORY_MAX_TURNS", "50"))
+history_ttl_seconds = int(os.getenv("HISTORY_TTL_SECONDS", str(30 * 24 * 3600)))
+# How long the status of a prompt that failed or is waiting for a retry is kept
+prompt_status_ttl_seconds = int(os.getenv("PROMPT_STATUS_TTL_SECONDS", "86400"))
+
+# Context assembly settings: turns read from Redis, prompt token budget, and hot conversations kept in memory
+context_turns = int(os.getenv("CONTEXT_TURNS", "10"))
+context_token_budget = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+context_cache_size = int(os.getenv("CONTEXT_CACHE_SIZE", "10000"))
+
+# Pub/sub channel announcing which conversations got new turns or prompt statuses, once per flush
+HISTORY_UPDATES_CHANNEL = "conversation_updates"
+
+
+def conversation_key(conversation_id):
+    return f"conversation:{conversation_id}"
+
+
+def prompt_status_key(message_id):
+    return f"prompt_status:{message_id}"
+
+
+def encode_prompt_status(message_id, status, error=None):
+    """
+    Status of a prompt that has no answer: "retrying", or "failed" once dead-lettered
+    """
+    record = {"message_id": message_id, "status": status}
+    if error is not None:
+        record["error"] = error
+    return json.dumps(record, separators=(",", ":"))
+
+
+def encode_turn(question, answer, message_id=None):
+    """
+    Serialize a turn once, with compact separators, for both Redis and logging
+    """
+    turn = {"question": question, "answer": answer}
+    if message_id is not None:
+        # Lets HTTP clients match an answer to the prompt they submitted
+        turn["message_id"] = message_id
+    return json.dumps(turn, separators=(",", ":"))
+
+
+class ConversationCache:
+    """
+    In-process LRU of recent conversation windows.
+
+    A window holds the last context_turns turns, oldest first, as
+    (question, answer, tokens, message_id) so token counts are computed once
+    per turn.
+    Windows are loaded from Redis on a miss and kept current by
+    HistoryWriter.append, so turns still waiting for a pipelined flush are
+    visible to the next message of the same conversation.
+    """
+
+    def __init__(
+        self, redis_client, model, max_turns=context_turns, size=context_cache_size
+    ):
+        self.redis_client = redis_client
+        self.model = model
+        self.max_turns = max_turns
+        self.size = size
+        self._windows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _make_turn(self, question, answer, message_id=None):
+        tokens = count_message_tokens((question, answer), self.model)
+        return (question, answer, tokens, message_id)
+
+    def get_window(self, conversation_id):
+        with self._lock:
+            window = self._windows.get(conversation_id)
+            if window is not None:
+                self._windows.move_to_end(conversation_id)
+                return list(window)
+
+        # Miss: newest entries are at the head of the Redis list
+        raw_turns = self.redis_client.lrange(
+            conversation_key(conversation_id), 0, self.max_turns - 1
+        )
+        window = []
+        for raw_turn in reversed(raw_turns):
+            turn = json.loads(raw_turn)
+            window.append(
+                self._make_turn(
+                    turn["question"], turn["answer"], turn.get("message_id")
+                )
+            )
+
+        with self._lock:
+            self._windows[conversation_id] = window
+            self._evict()
+        return list(window)
+
+    def find_answer(self, conversation_id, message_id):
+        """
+        The stored answer to message_id if it is among the recent turns, e.g.
+        for a message delivered again after its turn was written
+        """
+        for _, answer, _, turn_message_id in self.get_window(conversation_id):
+            if turn_message_id == message_id:
+                return answer
+        return None
+
+    def add_turn(self, conversation_id, question, answer, message_id=None):
+        turn = self._make_turn(question, answer, message_id)
+        with self._lock:
+            window = self._windows.get(conversation_id)
+            if window is None:
+                # Not cached: the next get_window reloads it from Redis
+                return
+            window.append(turn)
+            del window[: -self.max_turns]
+            self._windows.move_to_end(conversation_id)
+
+    def clear(self):
+        """
+        Drop every window, e.g. after a rebalance moved conversations to another consumer
+        """
+        with self._lock:
+            self._windows.clear()
+
+    def _evict(self):
+        while len(self._windows) > self.size:
+            self._windows.popitem(last=False)
+
+
+def pack_context(window, prompt_tokens, budget=context_token_budget):
+    """
+    Pick the most recent turns that fit in the token budget, returned oldest first
+    """
+    remaining = budget - prompt_tokens
+    packed = []
+    for question, answer, tokens, _ in reversed(window):
+        if tokens > remaining:
+            break
+        packed.append((question, answer))
+        remaining -= tokens
+    packed.reverse()
+    return packed
+
+
+class HistoryWriter:
+    """
+    Buffers conversation turns and writes them to Redis in pipelined batches.
+
+    Each flush sends one round trip for the whole buffer: per conversation an
+    LPUSH of all new turns, an LTRIM to the last history_max_turns entries and,
+    if configured, an EXPIRE so idle conversations are evicted. The same round
+    trip publishes the updated conversation ids on HISTORY_UPDATES_CHANNEL so
+    waiting readers wake up without polling.
+
+    Worker threads only append; the consumer loop flushes once the messages
+    whose turns are buffered are done, so a failed flush never drops turns of
+    messages whose offsets another thread is about to commit.
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        max_turns=history_max_turns,
+        ttl_seconds=history_ttl_seconds,
+        conversation_cache=None,
+    ):
+        self.redis_client = redis_client
+        self.conversation_cache = conversation_cache
+        self.max_turns = max_turns
+        self.ttl_seconds = ttl_seconds
+        self._pending = []
+        self._statuses = []
+        self._lock = threading.Lock()
+
+    def append(
+        self, conversation_id, encoded_turn, question=None, answer=None, message_id=None
+    ):
+        if self.conversation_cache is not None and question is not None:
+            self.conversation_cache.add_turn(
+                conversation_id, question, answer, message_id
+            )
+        with self._lock:
+            self._pending.append((conversation_id, encoded_turn))
+
+    def set_status(self, conversation_id, message_id, encoded_status):
+        """
+        Buffer a prompt status (see encode_prompt_status), written with the next flush
+        """
+        with self._lock:
+            self._statuses.append((conversation_id, message_id, encoded_status))
+
+    def flush(self):
+        """
+        Write every buffered turn and prompt status; returns the number of turns written.
+
+        If Redis fails they stay buffered, ahead of anything appended meanwhile,
+        and the error is raised.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+            statuses, self._statuses = self._statuses, []
+        if not pending and not statuses:
+            return 0
+
+        # Group by conversation, preserving arrival order within each one
+        turns_by_id = {}
+        for conversation_id, encoded_turn in pending:
+            turns_by_id.setdefault(conversation_id, []).append(encoded_turn)
+
+        pipe = self.redis_client.pipeline(transaction=False)
+        for conversation_id, turns in turns_by_id.items():
+            key = conversation_key(conversation_id)
+            # LPUSH with several values leaves the last one at the head, same as sequential LPUSHes
+            pipe.lpush(key, *turns)
+            if self.max_turns > 0:
+                pipe.ltrim(key, 0, self.max_turns - 1)
+            if self.ttl_seconds > 0:
+                pipe.expire(key, self.ttl_seconds)
+        updated = list(turns_by_id)
+        for conversation_id, message_id, encoded_status in statuses:
+            pipe.set(
+                prompt_status_key(message_id),
+                encoded_status,
+                ex=prompt_status_ttl_seconds or None,
+            )
+            if conversation_id not in turns_by_id:
+                updated.append(conversation_id)
+        pipe.publish(HISTORY_UPDATES_CHANNEL, json.dumps(updated))
+        try:
+            pipe.execute()
+        except Exception:
+            with self._lock:
+                self._pending[:0] = pending
+                self._statuses[:0] = statuses
+            raise
+
+        logger.info(
+            f"Stored {len(pending)} turns for {len(turns_by_id)} conversations in Redis"
+        )
+        return len(pending)
+
+    def discard(self):
+        """
+        Drop every buffered turn and prompt status, e.g. for messages about to be reprocessed
+        """
+        with self._lock:
+            self._pending = []
+            self._statuses = []
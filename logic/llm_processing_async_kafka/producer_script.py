@@ -1,22 +1,21 @@
-import uuid
-from confluent_kafka import Producer, KafkaException
-from confluent_kafka.admin import AdminClient, NewTopic
-from langchain_openai import ChatOpenAI
-from langchain.schema import HumanMessage
+import argparse
+import csv
 import json
 import logging
-import sys
-
-from dotenv import load_dotenv
 import os
+import sys
+import time
+import uuid
 
-# Load environment variables
-load_dotenv()
-
-# Initialize LLM
-llm = ChatOpenAI(
-    model="gpt-3.5-turbo", temperature=0.7, api_key=os.getenv("OPENAI_API_KEY")
+from logic.llm_processing_async_kafka.configs import (
+    create_topic,
+    dead_letter_topic_for,
+    delivery_report,
+    retry_topic_for,
+    settings,
 )
+from logic.llm_processing_async_kafka.publisher import Publisher
+from logic.llm_processing_async_kafka.tracing import new_trace_headers
 
 # Configure logging
 logging.basicConfig(
@@ -24,76 +23,28 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Kafka configuration
-# Note: Using the internal Docker network connection since we're getting connection refused on localhost
-kafka_config = {
-    "bootstrap.servers": "localhost:29092",
-    "client.id": "python-producer",
-    "socket.timeout.ms": 10000,  # Increase timeout for troubleshooting
-    "request.timeout.ms": 20000,
-}
+# Batch mode settings
+checkpoint_every = int(os.getenv("PRODUCER_CHECKPOINT_EVERY", "10000"))
+progress_interval = float(os.getenv("PRODUCER_PROGRESS_INTERVAL", "5"))
 
 
-def create_topic(topic_name, num_partitions=1, replication_factor=1):
+def publish_message(publisher, topic, message):
     """
-    Create a Kafka topic if it doesn't exist
-    """
-    admin_client = AdminClient(kafka_config)
-
-    # Check if topic already exists
-    metadata = admin_client.list_topics(timeout=10)
-    if topic_name in metadata.topics:
-        logger.info(f"Topic {topic_name} already exists")
-        return
-
-    # Create topic
-    topic = NewTopic(
-        topic_name, num_partitions=num_partitions, replication_factor=replication_factor
-    )
-
-    try:
-        futures = admin_client.create_topics([topic])
-
-        # Wait for topic creation
-        for topic_name, future in futures.items():
-            future.result()  # Blocks until topic is created
-            logger.info(f"Topic {topic_name} created successfully")
-    except KafkaException as e:
-        logger.error(f"Failed to create topic {topic_name}: {e}")
-        sys.exit(1)
-
-
-def delivery_report(err, msg):
-    """
-    Callback function for message delivery reports
-    """
-    if err is not None:
-        logger.error(f"Message delivery failed: {err}")
-    else:
-        logger.info(
-            f"Message delivered to {msg.topic()} [{msg.partition()}] at offset {msg.offset()}"
-        )
-
-
-def publish_message(producer, topic, message):
-    """
-    Publish a message to a Kafka topic
+    Publish a message to a Kafka topic without waiting for delivery
     """
     try:
         # Convert dict to JSON string
         message_json = json.dumps(message)
 
-        # Produce message
-        producer.produce(
+        # Enqueue message; delivery is reported asynchronously by the publisher's poll loop
+        publisher.publish(
             topic=topic,
             key=str(message.get("conversation_id")),
             value=message_json,
+            headers=new_trace_headers(),
             callback=delivery_report,
         )
 
-        # Flush to ensure message is sent
-        producer.flush()
-
     except Exception as e:
         logger.error(f"Failed to publish message: {e}")
         return False
@@ -112,12 +63,188 @@ def create_llm_message(prompt, conversation_id):
     }
 
 
-def main():
-    topic_name = "async_user_prompt"
-    create_topic(topic_name)
+class OffsetLines:
+    """
+    Iterate a binary file as text lines, tracking the byte offset after the last line read
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.offset = file.tell()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.file.readline()
+        if not line:
+            raise StopIteration
+        self.offset = self.file.tell()
+        return line.decode("utf-8")
+
+
+def read_prompts(path, input_format, offset=0):
+    """
+    Stream (record, end_offset) pairs from a JSONL or CSV file, starting at a byte offset.
+
+    Only one line (or one CSV row) is held in memory at a time, and
+    end_offset is where to resume to skip everything up to this record.
+    """
+    with open(path, "rb") as file:
+        lines = OffsetLines(file)
+        if input_format == "csv":
+            # The header is always read from the top, even when resuming
+            header = next(csv.reader(lines), None)
+            if header is None:
+                return
+            fieldnames = [name.lstrip("\ufeff") for name in header]
+            if offset:
+                file.seek(offset)
+                lines.offset = offset
+            for row in csv.DictReader(lines, fieldnames=fieldnames):
+                yield row, lines.offset
+        else:
+            file.seek(offset)
+            lines.offset = offset
+            for line in lines:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    logger.warning(
+                        f"Skipping invalid JSON ending at byte {lines.offset}: {e}"
+                    )
+                    record = None
+                if record is not None and not isinstance(record, dict):
+                    logger.warning(
+                        f"Skipping JSON {type(record).__name__} ending at byte {lines.offset}: "
+                        "expected an object with a prompt field"
+                    )
+                    record = None
+                yield record, lines.offset
+
+
+def load_checkpoint(checkpoint_path, input_path):
+    """
+    (byte offset, records published) to resume the input from
+    """
+    try:
+        with open(checkpoint_path) as file:
+            checkpoint = json.load(file)
+    except FileNotFoundError:
+        return 0, 0
+    if checkpoint.get("input") != os.path.abspath(input_path):
+        logger.warning(
+            f"Ignoring checkpoint {checkpoint_path}: written for {checkpoint.get('input')}"
+        )
+        return 0, 0
+    logger.info(
+        f"Resuming {input_path} after {checkpoint['records']} records (byte {checkpoint['offset']})"
+    )
+    return checkpoint["offset"], checkpoint["records"]
+
+
+def save_checkpoint(checkpoint_path, input_path, offset, records):
+    # Write and rename so a crash never leaves a half-written checkpoint
+    tmp_path = f"{checkpoint_path}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(
+            {
+                "input": os.path.abspath(input_path),
+                "offset": offset,
+                "records": records,
+            },
+            file,
+        )
+    os.replace(tmp_path, checkpoint_path)
+
+
+def publish_file(
+    publisher,
+    topic,
+    input_path,
+    input_format,
+    rate=None,
+    checkpoint_path=None,
+    checkpoint_every=checkpoint_every,
+):
+    """
+    Publish every prompt in a file, pipelined, optionally capped at `rate` msgs/sec.
+
+    Messages are only enqueued; every checkpoint_every records the publisher is
+    flushed and, if nothing failed, the checkpoint is advanced past them. A
+    restart therefore re-sends at most one checkpoint interval of prompts.
+    Returns the number of messages published.
+    """
+    offset, published_before = (
+        load_checkpoint(checkpoint_path, input_path) if checkpoint_path else (0, 0)
+    )
+    start_offset = offset
+    published = 0
+    skipped = 0
+    failed_before = publisher.stats()["failed"]
+    start_time = time.perf_counter()
+    last_progress = start_time
+
+    def checkpoint():
+        nonlocal failed_before
+        publisher.flush()
+        failed = publisher.stats()["failed"]
+        if failed > failed_before:
+            # Don't move past messages that never reached Kafka; resume re-sends them
+            raise RuntimeError(f"{failed - failed_before} messages failed delivery")
+        failed_before = failed
+        if checkpoint_path:
+            save_checkpoint(
+                checkpoint_path, input_path, offset, published_before + published
+            )
+
+    for record, offset in read_prompts(input_path, input_format, start_offset):
+        if not record or not record.get("prompt"):
+            skipped += 1
+            continue
+
+        message = create_llm_message(
+            prompt=record["prompt"],
+            conversation_id=record.get("conversation_id") or str(uuid.uuid4()),
+        )
+        message["message_id"] = record.get("message_id") or os.urandom(16).hex()
+        publisher.publish(
+            topic=topic,
+            key=message["conversation_id"],
+            value=json.dumps(message),
+            headers=new_trace_headers(),
+        )
+        published += 1
+
+        if rate:
+            # Pace against the start time so short stalls are caught up, not lost
+            delay = start_time + published / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        if published % checkpoint_every == 0:
+            checkpoint()
 
-    producer = Producer(kafka_config)
+        now = time.perf_counter()
+        if now - last_progress >= progress_interval:
+            last_progress = now
+            stats = publisher.stats()
+            logger.info(
+                f"Published {published} ({published / (now - start_time):.1f} msgs/sec), "
+                f"delivered {stats['delivered']}, failed {stats['failed']}, queued {stats['in_queue']}"
+            )
 
+    checkpoint()
+    elapsed = time.perf_counter() - start_time
+    logger.info(
+        f"Published {published} prompts from {input_path} ({skipped} skipped) in {elapsed:.2f}s "
+        f"({published / elapsed if elapsed else 0:.1f} msgs/sec sustained, including final flush)"
+    )
+    return published
+
+
+def interactive_loop(publisher, topic_name):
     conversation_id = str(uuid.uuid4())
     while True:
         user_prompt = input("Enter your prompt: ")
@@ -129,10 +256,73 @@ def main():
         )
 
         print(f"Publishing message: {message_to_publish}")
-        publish_message(producer, topic_name, message_to_publish)
+        publish_message(publisher, topic_name, message_to_publish)
 
         logger.info("Messages published successfully")
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Publish prompts interactively, or in bulk from a JSONL/CSV file"
+    )
+    parser.add_argument("--input", help="JSONL or CSV file with a prompt field/column")
+    parser.add_argument(
+        "--format", choices=("jsonl", "csv"), help="Defaults to the file extension"
+    )
+    parser.add_argument("--rate", type=float, help="Max messages per second")
+    parser.add_argument(
+        "--checkpoint", help="Resume file (default: <input>.checkpoint)"
+    )
+    parser.add_argument(
+        "--restart", action="store_true", help="Ignore an existing checkpoint"
+    )
+    parser.add_argument(
+        "--grow-partitions",
+        action="store_true",
+        help="Add partitions to existing topics up to KAFKA_TOPIC_PARTITIONS. Keys are "
+        "re-hashed, so only do this while no conversation has messages in flight",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    topic_name = settings.kafka.prompt_topic
+    create_topic(topic_name, grow=args.grow_partitions)
+    create_topic(retry_topic_for(topic_name), grow=args.grow_partitions)
+    create_topic(dead_letter_topic_for(topic_name), grow=args.grow_partitions)
+
+    publisher = Publisher(settings.producer_config())
+
+    try:
+        if args.input:
+            input_format = args.format or (
+                "csv" if args.input.endswith(".csv") else "jsonl"
+            )
+            checkpoint_path = args.checkpoint or f"{args.input}.checkpoint"
+            if args.restart and os.path.exists(checkpoint_path):
+                os.remove(checkpoint_path)
+            publish_file(
+                publisher,
+                topic_name,
+                args.input,
+                input_format,
+                rate=args.rate,
+                checkpoint_path=checkpoint_path,
+            )
+        else:
+            interactive_loop(publisher, topic_name)
+    except (KeyboardInterrupt, EOFError):
+        logger.info("Producer stopped by user")
+    except RuntimeError as e:
+        logger.error(
+            f"Stopping batch publish, resume to retry from the last checkpoint: {e}"
+        )
+        sys.exit(1)
+    finally:
+        # Flush only on shutdown
+        publisher.close()
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,123 @@
+import logging
+import threading
+import time
+
+from confluent_kafka import Producer
+
+from logic.llm_processing_async_kafka.configs import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Publisher:
+    """
+    Non-blocking Kafka publisher.
+
+    produce() only enqueues into librdkafka's buffer. A background thread
+    serves delivery callbacks with poll(), and flush() is reserved for
+    shutdown or explicit barriers. Before committing consumer offsets use
+    barrier(), which also reports delivery failures since the previous one.
+    """
+
+    def __init__(self, config=None, producer=None, poll_interval=0.1):
+        if producer is None:
+            # Batching, compression and durability come from the active pipeline profile
+            producer = Producer(config or settings.producer_config())
+        self.producer = producer
+        self.poll_interval = poll_interval
+        self.produced = 0
+        self.delivered = 0
+        self.failed = 0
+        # Delivery failures not yet reported by barrier()
+        self._failed_since_barrier = 0
+        self.started_at = time.perf_counter()
+        self._lock = threading.Lock()
+        self._running = True
+        self._poll_thread = threading.Thread(
+            target=self._poll_loop, name="kafka-poll", daemon=True
+        )
+        self._poll_thread.start()
+
+    def _poll_loop(self):
+        while self._running:
+            self.producer.poll(self.poll_interval)
+
+    def _on_delivery(self, err, msg, callback=None):
+        with self._lock:
+            if err is None:
+                self.delivered += 1
+            else:
+                self.failed += 1
+                self._failed_since_barrier += 1
+        if err is not None:
+            logger.error(f"Message delivery failed: {err}")
+        if callback is not None:
+            callback(err, msg)
+
+    def publish(self, topic, value, key=None, headers=None, callback=None, block=True):
+        """
+        Enqueue a message; blocks only while the local buffer is full.
+
+        With block=False a full buffer raises BufferError instead, so callers
+        on an event loop can shed load rather than stall it.
+        """
+        while True:
+            try:
+                self.producer.produce(
+                    topic=topic,
+                    key=key,
+                    value=value,
+                    headers=headers,
+                    on_delivery=lambda err, msg: self._on_delivery(err, msg, callback),
+                )
+                break
+            except BufferError:
+                if not block:
+                    raise
+                # Local queue is full, let librdkafka drain some messages first
+                self.producer.poll(0.1)
+        with self._lock:
+            self.produced += 1
+
+    def flush(self, timeout=30):
+        """
+        Barrier: wait until every enqueued message is delivered or failed
+        """
+        remaining = self.producer.flush(timeout)
+        if remaining:
+            logger.error(f"{remaining} messages still undelivered after flush")
+        return remaining
+
+    def barrier(self, timeout=30):
+        """
+        Flush, then report whether every message published since the previous
+        barrier was delivered. Only commit consumer offsets when this is True.
+        """
+        remaining = self.flush(timeout)
+        with self._lock:
+            failed, self._failed_since_barrier = self._failed_since_barrier, 0
+        if failed:
+            logger.error(f"{failed} messages failed delivery since the last barrier")
+        return remaining == 0 and failed == 0
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.started_at
+        with self._lock:
+            return {
+                "produced": self.produced,
+                "delivered": self.delivered,
+                "failed": self.failed,
+                "in_queue": len(self.producer),
+                "elapsed": elapsed,
+                "msgs_per_sec": self.produced / elapsed if elapsed else 0.0,
+            }
+
+    def close(self, timeout=30):
+        self.flush(timeout)
+        self._running = False
+        self._poll_thread.join()
+        stats = self.stats()
+        logger.info(
+            f"Publisher closed: {stats['produced']} produced, {stats['delivered']} delivered, "
+            f"{stats['failed']} failed, {stats['msgs_per_sec']:.1f} msgs/sec"
+        )
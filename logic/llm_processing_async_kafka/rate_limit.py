@@ -0,0 +1,156 @@
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# OpenAI quota shared by every consumer process (requests and tokens per minute)
+openai_rpm_limit = int(os.getenv("OPENAI_RPM_LIMIT", "3500"))
+openai_tpm_limit = int(os.getenv("OPENAI_TPM_LIMIT", "90000"))
+# Completion tokens are unknown up front, so reserve this many per request
+completion_token_estimate = int(os.getenv("OPENAI_COMPLETION_TOKEN_ESTIMATE", "256"))
+
+# AIMD concurrency settings
+concurrency_initial = int(os.getenv("CONCURRENCY_INITIAL", "4"))
+concurrency_target_latency = float(os.getenv("CONCURRENCY_TARGET_LATENCY", "10"))
+concurrency_decrease_factor = float(os.getenv("CONCURRENCY_DECREASE_FACTOR", "0.5"))
+concurrency_decrease_cooldown = float(os.getenv("CONCURRENCY_DECREASE_COOLDOWN", "5"))
+
+# Atomically refill and take from several token buckets, using Redis time so
+# every process shares one clock. Returns the seconds to wait (0 = granted).
+# KEYS: bucket keys; ARGV: (capacity, refill_per_second, requested) per key
+TOKEN_BUCKET_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local wait = 0
+local levels = {}
+for i, key in ipairs(KEYS) do
+    local base = (i - 1) * 3
+    local capacity = tonumber(ARGV[base + 1])
+    local rate = tonumber(ARGV[base + 2])
+    local requested = tonumber(ARGV[base + 3])
+    local state = redis.call('HMGET', key, 'level', 'ts')
+    local level = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    level = math.min(capacity, level + (now - ts) * rate)
+    levels[i] = level
+    if level < requested then
+        wait = math.max(wait, (requested - level) / rate)
+    end
+end
+if wait == 0 then
+    for i, key in ipairs(KEYS) do
+        local requested = tonumber(ARGV[(i - 1) * 3 + 3])
+        redis.call('HSET', key, 'level', levels[i] - requested, 'ts', now)
+        redis.call('EXPIRE', key, 120)
+    end
+end
+return tostring(wait)
+"""
+
+
+class RedisRateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute buckets shared across processes via Redis
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        rpm=openai_rpm_limit,
+        tpm=openai_tpm_limit,
+        prefix="ratelimit:{openai}",
+    ):
+        self.redis_client = redis_client
+        self.rpm = rpm
+        self.tpm = tpm
+        # The hash tag keeps both keys in one cluster slot for the script
+        self.keys = [f"{prefix}:rpm", f"{prefix}:tpm"]
+        self._script = redis_client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def try_acquire(self, tokens):
+        """
+        Take one request and `tokens` tokens; returns seconds to wait if not granted
+        """
+        tokens = min(tokens, self.tpm)
+        args = [self.rpm, self.rpm / 60, 1, self.tpm, self.tpm / 60, tokens]
+        return float(self._script(keys=self.keys, args=args))
+
+    def acquire(self, tokens):
+        """
+        Block until the request fits under both quotas; returns total seconds waited
+        """
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return waited
+            # Jitter so processes woken together don't hit Redis in lockstep
+            sleep_for = min(wait, 1.0) * random.uniform(1.0, 1.2)
+            time.sleep(sleep_for)
+            waited += sleep_for
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD limit on concurrent LLM calls.
+
+    Each success under the target latency raises the limit by 1/limit (about
+    +1 per round of calls); a 429 or a slow response multiplies it by
+    decrease_factor, at most once per cooldown so a burst of 429s from one
+    overshoot only backs off once.
+    """
+
+    def __init__(
+        self,
+        max_limit,
+        initial=concurrency_initial,
+        min_limit=1,
+        target_latency=concurrency_target_latency,
+        decrease_factor=concurrency_decrease_factor,
+        decrease_cooldown=concurrency_decrease_cooldown,
+    ):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(max(min_limit, min(initial, max_limit)))
+        self.target_latency = target_latency
+        self.decrease_factor = decrease_factor
+        self.decrease_cooldown = decrease_cooldown
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def slot(self):
+        with self._condition:
+            self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.in_flight -= 1
+                self._condition.notify()
+
+    def on_success(self, latency):
+        if latency > self.target_latency:
+            self._decrease(f"latency {latency:.2f}s above target")
+            return
+        with self._condition:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._condition.notify()
+
+    def on_rate_limited(self):
+        self._decrease("rate limited")
+
+    def _decrease(self, reason):
+        with self._condition:
+            now = time.monotonic()
+            if now - self._last_decrease < self.decrease_cooldown:
+                return
+            self._last_decrease = now
+            self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+            logger.warning(f"Concurrency limit lowered to {self.limit:.1f} ({reason})")
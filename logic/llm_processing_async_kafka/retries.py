@@ -0,0 +1,139 @@
+import logging
+import os
+import random
+import time
+
+import openai
+import redis
+from confluent_kafka import TopicPartition
+from tenacity import (
+    Retrying,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_random_exponential,
+)
+
+from logic.llm_processing_async_kafka.configs import (
+    dead_letter_topic_for,
+    retry_topic_for,
+)
+from logic.llm_processing_async_kafka.tracing import (
+    get_header,
+    propagate_trace_headers,
+)
+from logic.singleflight import SingleFlightError
+
+logger = logging.getLogger(__name__)
+
+# Retry settings
+inline_retry_attempts = int(os.getenv("RETRY_INLINE_ATTEMPTS", "3"))
+inline_retry_max_wait = float(os.getenv("RETRY_INLINE_MAX_WAIT", "4"))
+max_retry_topic_attempts = int(os.getenv("RETRY_TOPIC_ATTEMPTS", "5"))
+retry_topic_base_delay = float(os.getenv("RETRY_TOPIC_BASE_DELAY", "5"))
+# Keep well below max.poll.interval.ms (300s), since the relay sleeps until a retry is due
+retry_topic_max_delay = float(os.getenv("RETRY_TOPIC_MAX_DELAY", "120"))
+
+
+# Errors worth retrying: rate limits, timeouts and upstream/infrastructure hiccups.
+# Anything else (bad JSON, missing fields, 400s from OpenAI) is a poison message.
+TRANSIENT_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+    redis.ConnectionError,
+    redis.TimeoutError,
+)
+
+
+def is_transient(error):
+    if isinstance(error, SingleFlightError):
+        # A coalesced LLM call failed; classify the shared upstream error
+        error = error.__cause__
+    return isinstance(error, TRANSIENT_ERRORS)
+
+
+def call_with_retries(fn, attempts=inline_retry_attempts):
+    """
+    Call fn, retrying transient errors in-process with jittered exponential backoff
+    """
+    retrying = Retrying(
+        stop=stop_after_attempt(attempts),
+        wait=wait_random_exponential(multiplier=0.5, max=inline_retry_max_wait),
+        retry=retry_if_exception_type(TRANSIENT_ERRORS),
+        before_sleep=lambda state: logger.warning(
+            f"Transient error, retrying (attempt {state.attempt_number}): {state.outcome.exception()}"
+        ),
+        reraise=True,
+    )
+    return retrying(fn)
+
+
+def route_failure(publisher, message, error, source_topic):
+    """
+    Move a failed message aside so it never blocks its partition.
+
+    Transient failures go to the retry topic with a not_before timestamp and
+    a jittered exponential delay; poison messages and messages that ran out
+    of attempts go straight to the dead-letter topic.
+    """
+    attempt = int(get_header(message, "retry_attempt", "0")) + 1
+    headers = [
+        ("source_topic", source_topic),
+        ("retry_attempt", str(attempt)),
+        ("error", f"{type(error).__name__}: {error}"[:1000]),
+        *propagate_trace_headers(message),
+    ]
+
+    if is_transient(error) and attempt <= max_retry_topic_attempts:
+        delay = min(retry_topic_max_delay, retry_topic_base_delay * 2 ** (attempt - 1))
+        delay = random.uniform(delay / 2, delay)
+        headers.append(("not_before", str(time.time() + delay)))
+        target_topic = retry_topic_for(source_topic)
+        logger.warning(f"Scheduling retry {attempt} in {delay:.1f}s: {error}")
+    else:
+        target_topic = dead_letter_topic_for(source_topic)
+        logger.error(f"Sending message to dead-letter topic {target_topic}: {error}")
+
+    publisher.publish(
+        topic=target_topic, key=message.key(), value=message.value(), headers=headers
+    )
+    return target_topic
+
+
+def relay_retries(consumer, publisher, stop_event=None, poll_timeout=1.0):
+    """
+    Move messages from a retry topic back to their source topic once they are due.
+
+    Delays only hold up the retry topic, never the main pipeline. The offset is
+    committed only once the message has been delivered to its source topic;
+    otherwise the relay seeks back and re-publishes it.
+    """
+    while stop_event is None or not stop_event.is_set():
+        message = consumer.poll(timeout=poll_timeout)
+        if message is None:
+            continue
+        if message.error():
+            logger.error(f"Retry consumer error: {message.error()}")
+            continue
+
+        wait = float(get_header(message, "not_before", "0")) - time.time()
+        if wait > 0:
+            time.sleep(wait)
+
+        publisher.publish(
+            topic=get_header(message, "source_topic"),
+            key=message.key(),
+            value=message.value(),
+            headers=[
+                ("retry_attempt", get_header(message, "retry_attempt", "0")),
+                *propagate_trace_headers(message),
+            ],
+        )
+        if not publisher.barrier():
+            logger.error("Retry was not delivered, re-reading it")
+            consumer.seek(
+                TopicPartition(message.topic(), message.partition(), message.offset())
+            )
+            continue
+        consumer.commit(message=message, asynchronous=False)
@@ -0,0 +1,51 @@
+import logging
+import threading
+
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+# Extra tokens the chat format adds around every message
+TOKENS_PER_MESSAGE = 4
+
+_encodings = {}
+_encodings_lock = threading.Lock()
+
+
+def _load_encoding(model):
+    try:
+        encoding_name = tiktoken.encoding_name_for_model(model)
+    except KeyError:
+        encoding_name = "cl100k_base"
+    try:
+        return tiktoken.get_encoding(encoding_name)
+    except Exception as e:
+        logger.warning(
+            f"Could not load tiktoken encoding for {model}, estimating tokens: {e}"
+        )
+        return None
+
+
+def get_encoding(model):
+    """
+    Load the tokenizer once per model; None if it can't be loaded (e.g. offline)
+    """
+    if model in _encodings:
+        return _encodings[model]
+    # Worker threads start together, so make sure only one of them loads the encoding
+    with _encodings_lock:
+        if model not in _encodings:
+            _encodings[model] = _load_encoding(model)
+    return _encodings[model]
+
+
+def count_tokens(text, model):
+    encoding = get_encoding(model)
+    if encoding is None:
+        # Roughly 4 characters per token for English text
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(texts, model):
+    return sum(count_tokens(text, model) + TOKENS_PER_MESSAGE for text in texts)
@@ -0,0 +1,124 @@
+"""
+Per-stage latency report for the async LLM pipeline.
+
+Reads traced messages from the response topic and prints p50/p95/p99 for each
+stage recorded by the consumer, plus end-to-end latency and consumer lag.
+Stages: queue (Kafka, including retry delays), context (history read), llm,
+history_buffer (queueing the turn), redis_flush (waiting for the batch's
+pipelined Redis write). The republish stage (publish to broker
+acknowledgement) can't travel in the response itself; the consumer logs it
+per message with the trace id.
+
+Usage:
+    python -m logic.llm_processing_async_kafka.trace_report --messages 1000
+"""
+
+import argparse
+import json
+import time
+import uuid
+
+from confluent_kafka import Consumer, TopicPartition
+
+from logic.llm_processing_async_kafka.configs import settings
+from logic.llm_processing_async_kafka.tracing import get_header
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def collect_stage_samples(topic, max_messages, idle_timeout):
+    """
+    Read the response topic from the beginning with a throwaway group
+    """
+    consumer = Consumer(
+        settings.consumer_config(
+            group_id=f"trace-report-{uuid.uuid4().hex[:8]}",
+            overrides={"enable.auto.commit": False},
+        )
+    )
+    consumer.subscribe([topic])
+    samples = {}
+    read = 0
+    last_message_at = time.time()
+    try:
+        while read < max_messages and time.time() - last_message_at < idle_timeout:
+            message = consumer.poll(timeout=1.0)
+            if message is None or message.error():
+                continue
+            last_message_at = time.time()
+            read += 1
+
+            stages = get_header(message, "stages")
+            if stages is None:
+                continue
+            for stage, duration in json.loads(stages).items():
+                samples.setdefault(stage, []).append(duration)
+
+            produced_at = get_header(message, "produced_at")
+            _, created_ms = message.timestamp()
+            if produced_at is not None and created_ms > 0:
+                samples.setdefault("end_to_end", []).append(
+                    created_ms / 1000 - float(produced_at)
+                )
+    finally:
+        consumer.close()
+    return read, samples
+
+
+def consumer_lag(topic, group_id):
+    """
+    Per-partition lag of a consumer group: high watermark minus committed offset
+    """
+    consumer = Consumer(settings.consumer_config(group_id=group_id))
+    try:
+        metadata = consumer.list_topics(topic, timeout=10)
+        partitions = [
+            TopicPartition(topic, partition)
+            for partition in metadata.topics[topic].partitions
+        ]
+        lag = {}
+        for tp in consumer.committed(partitions, timeout=10):
+            _, high = consumer.get_watermark_offsets(tp, timeout=10)
+            committed = tp.offset if tp.offset >= 0 else 0
+            lag[tp.partition] = max(0, high - committed)
+        return lag
+    finally:
+        consumer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--response-topic", default=settings.kafka.response_topic)
+    parser.add_argument("--prompt-topic", default=settings.kafka.prompt_topic)
+    parser.add_argument("--group-id", default=settings.kafka.group_id)
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--idle-timeout", type=float, default=5.0)
+    args = parser.parse_args()
+
+    read, samples = collect_stage_samples(
+        args.response_topic, args.messages, args.idle_timeout
+    )
+    print(f"Read {read} messages from {args.response_topic}")
+    print(f"{'stage':<15} {'count':>7} {'p50':>10} {'p95':>10} {'p99':>10}")
+    for stage, values in samples.items():
+        print(
+            f"{stage:<15} {len(values):>7} "
+            f"{percentile(values, 50) * 1000:>8.1f}ms "
+            f"{percentile(values, 95) * 1000:>8.1f}ms "
+            f"{percentile(values, 99) * 1000:>8.1f}ms"
+        )
+
+    lag = consumer_lag(args.prompt_topic, args.group_id)
+    print(
+        f"Consumer lag for {args.group_id} on {args.prompt_topic}: {sum(lag.values())}"
+    )
+    for partition, partition_lag in sorted(lag.items()):
+        print(f"  partition {partition}: {partition_lag}")
+
+
+if __name__ == "__main__":
+    main()
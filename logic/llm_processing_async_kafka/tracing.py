@@ -0,0 +1,66 @@
+import json
+import os
+import time
+
+# Headers carried from the prompt message through retries to the response message
+TRACE_HEADERS = ("trace_id", "produced_at")
+
+
+def new_trace_headers():
+    """
+    Headers stamped on a prompt when it is produced
+    """
+    # os.urandom is several times cheaper than uuid4() and gives the same 32 hex chars
+    return [("trace_id", os.urandom(16).hex()), ("produced_at", repr(time.time()))]
+
+
+def get_header(message, name, default=None):
+    for key, value in message.headers() or []:
+        if key == name:
+            return value.decode("utf-8") if isinstance(value, bytes) else value
+    return default
+
+
+def propagate_trace_headers(message):
+    """
+    Copy the trace headers of an incoming message so they survive re-publishing
+    """
+    return [
+        (name, get_header(message, name))
+        for name in TRACE_HEADERS
+        if get_header(message, name) is not None
+    ]
+
+
+class StageTimer:
+    """
+    Records the duration of consecutive pipeline stages for one message
+    """
+
+    def __init__(self, message):
+        self.trace_id = get_header(message, "trace_id")
+        produced_at = get_header(message, "produced_at")
+        self.produced_at = float(produced_at) if produced_at else None
+        self.consumed_at = time.time()
+        self.stages = {}
+        if self.produced_at is not None:
+            # Time spent waiting in Kafka (and the retry topic, if any)
+            self.stages["queue"] = max(0.0, self.consumed_at - self.produced_at)
+        self._last = time.perf_counter()
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.stages[stage] = now - self._last
+        self._last = now
+
+    def response_headers(self):
+        headers = [
+            ("consumed_at", repr(self.consumed_at)),
+            ("published_at", repr(time.time())),
+            ("stages", json.dumps(self.stages, separators=(",", ":"))),
+        ]
+        if self.trace_id is not None:
+            headers.append(("trace_id", self.trace_id))
+        if self.produced_at is not None:
+            headers.append(("produced_at", repr(self.produced_at)))
+        return headers
@@ -0,0 +1,121 @@
+"""
+Restaurant catalog (menu and reservation availability) for the realtime tools.
+
+The catalog is loaded once from a JSON data file into an immutable, indexed
+structure. Every tool response is serialized when the file is loaded, so
+answering a tool call is a dictionary lookup: no dicts are built and nothing
+is serialized on the realtime path. The file is re-read when it changes,
+checked at most every CATALOG_RELOAD_INTERVAL seconds; a file that fails to
+load leaves the previous catalog in place.
+"""
+
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CATALOG_PATH = os.getenv(
+    "RESTAURANT_CATALOG_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "catalog.json"),
+)
+CATALOG_RELOAD_INTERVAL = float(os.getenv("RESTAURANT_CATALOG_RELOAD_INTERVAL", "2"))
+
+
+class ToolOutput(str):
+    """
+    A tool result already serialized to JSON.
+
+    `literal` is the same text encoded as a JSON string, the way it appears in
+    the "output" field of a function_call_output item, so the event can be
+    assembled without escaping the output again.
+    """
+
+    def __new__(cls, value):
+        output = super().__new__(cls, json.dumps(value, separators=(",", ":")))
+        output.literal = json.dumps(str(output))
+        return output
+
+
+DISH_NOT_FOUND = ToolOutput({"error": "Dish not found"})
+
+
+@dataclass(frozen=True)
+class Catalog:
+    popular_dishes: ToolOutput
+    availability: ToolOutput
+    # Dish details by id; the model may send the id as a number or a string
+    dish_details: Mapping[object, ToolOutput]
+    mtime_ns: int = 0
+
+    def dish(self, dish_id):
+        return self.dish_details.get(dish_id, DISH_NOT_FOUND)
+
+
+def load_catalog(path=CATALOG_PATH):
+    with open(path, "rb") as f:
+        mtime_ns = os.fstat(f.fileno()).st_mtime_ns
+        data = json.load(f)
+
+    dish_details = {}
+    for dish in data["dishes"]:
+        details = ToolOutput(
+            {
+                "name": dish["name"],
+                "ingredients": dish["ingredients"],
+                "calories": dish["calories"],
+                "price": dish["price"],
+                "reviews": dish["reviews"],
+            }
+        )
+        dish_details[dish["id"]] = details
+        dish_details[str(dish["id"])] = details
+
+    return Catalog(
+        popular_dishes=ToolOutput(
+            [
+                {"id": dish["id"], "name": dish["name"]}
+                for dish in data["dishes"]
+                if dish.get("popular")
+            ]
+        ),
+        availability=ToolOutput(data["availability"]),
+        dish_details=MappingProxyType(dish_details),
+        mtime_ns=mtime_ns,
+    )
+
+
+catalog = load_catalog()
+_next_check = time.monotonic() + CATALOG_RELOAD_INTERVAL
+_reload_lock = threading.Lock()
+
+
+def _reload_if_changed():
+    global catalog
+    try:
+        if os.stat(CATALOG_PATH).st_mtime_ns == catalog.mtime_ns:
+            return
+        catalog = load_catalog()
+        print(f"Reloaded restaurant catalog from {CATALOG_PATH}")
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error reloading restaurant catalog, keeping the previous one: {e}")
+
+
+def get_catalog():
+    """
+    The current catalog, picking up changes to the data file
+    """
+    global _next_check
+    if time.monotonic() >= _next_check and _reload_lock.acquire(blocking=False):
+        try:
+            _next_check = time.monotonic() + CATALOG_RELOAD_INTERVAL
+            _reload_if_changed()
+        finally:
+            _reload_lock.release()
+    return catalog
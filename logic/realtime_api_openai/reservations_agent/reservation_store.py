@@ -0,0 +1,153 @@
+"""
+Reservation storage shared by every process serving the voice agent.
+
+Reservations live in a database (SQLite by default, any SQLAlchemy URL
+works) instead of process memory, so they survive restarts and every worker
+sees the same data. Ids come from the database's autoincrement, which is
+unique across processes. A booking is unique on (name, date, time): storing
+the same booking twice returns the first reservation, and storing different
+details for that slot raises ReservationConflict.
+"""
+
+import os
+import threading
+
+from dotenv import load_dotenv
+from sqlalchemy import (
+    Column,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Text,
+    create_engine,
+    event,
+    insert,
+    select,
+)
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+load_dotenv()
+
+RESERVATIONS_DATABASE_URL = os.getenv(
+    "RESERVATIONS_DATABASE_URL", "sqlite:///reservations.db"
+)
+# How long a write waits for another process holding the SQLite lock
+SQLITE_BUSY_TIMEOUT = float(os.getenv("RESERVATIONS_SQLITE_BUSY_TIMEOUT", "30"))
+
+metadata = MetaData()
+
+reservations = Table(
+    "reservations",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("name", String(200), nullable=False),
+    Column("date", String(10), nullable=False),
+    Column("time", String(5), nullable=False),
+    Column("party_size", Integer, nullable=False),
+    Column("created_at", String(32), nullable=False),
+    Column("extra_notes", Text),
+    # A tool call the model retries after a timeout must not book twice
+    Index("ix_reservations_request", "name", "date", "time", unique=True),
+)
+
+# Created on first use, once per process: worker processes must not share
+# connections inherited from a parent
+engine = None
+_engine_lock = threading.Lock()
+
+
+class ReservationConflict(Exception):
+    """
+    The (name, date, time) slot is already booked with different details
+    """
+
+    def __init__(self, existing):
+        super().__init__(
+            f"{existing['name']} already has a reservation on {existing['date']} "
+            f"at {existing['time']} for {existing['party_size']} people"
+        )
+        self.existing = existing
+
+
+def _enable_wal(dbapi_connection, connection_record):
+    # WAL lets readers carry on while another process writes
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.close()
+
+
+def _create_schema(engine):
+    metadata.create_all(engine)
+    # create_all skips every index of a table that already exists
+    for index in reservations.indexes:
+        index.create(engine, checkfirst=True)
+
+
+def get_engine():
+    global engine
+    if engine is None:
+        with _engine_lock:
+            if engine is None:
+                connect_args = {}
+                if RESERVATIONS_DATABASE_URL.startswith("sqlite"):
+                    # Tools run on a thread pool, and writers in other
+                    # processes may briefly hold the database lock
+                    connect_args = {
+                        "check_same_thread": False,
+                        "timeout": SQLITE_BUSY_TIMEOUT,
+                    }
+                new_engine = create_engine(
+                    RESERVATIONS_DATABASE_URL, connect_args=connect_args
+                )
+                if new_engine.dialect.name == "sqlite":
+                    event.listen(new_engine, "connect", _enable_wal)
+                try:
+                    _create_schema(new_engine)
+                except OperationalError:
+                    # Another worker created the table between the check and
+                    # the CREATE; it exists now
+                    _create_schema(new_engine)
+                engine = new_engine
+    return engine
+
+
+def add_reservation(reservation):
+    """
+    Store a reservation (a dict of the table's columns, without id); returns its id.
+
+    Idempotent: if the same booking already exists, e.g. the model retried a
+    make_reservation that timed out while its write was still running, the
+    existing reservation's id is returned. If (name, date, time) is booked with
+    a different party size or notes, raises ReservationConflict.
+    """
+    try:
+        with get_engine().begin() as connection:
+            result = connection.execute(insert(reservations).values(**reservation))
+            return result.inserted_primary_key[0]
+    except IntegrityError:
+        with get_engine().connect() as connection:
+            existing = (
+                connection.execute(
+                    select(reservations).where(
+                        reservations.c.name == reservation["name"],
+                        reservations.c.date == reservation["date"],
+                        reservations.c.time == reservation["time"],
+                    )
+                )
+                .one()
+                ._mapping
+            )
+        if (existing["party_size"], existing["extra_notes"]) != (
+            reservation["party_size"],
+            reservation.get("extra_notes"),
+        ):
+            raise ReservationConflict(dict(existing))
+        return existing["id"]
+
+
+def list_reservations():
+    with get_engine().connect() as connection:
+        rows = connection.execute(select(reservations).order_by(reservations.c.id))
+        return [dict(row._mapping) for row in rows]
@@ -1,9 +1,11 @@
 import os
 import json
+import asyncio
 import websocket
 import threading
 import base64
 import pyaudio
+from concurrent.futures import ThreadPoolExecutor
 
 from dotenv import load_dotenv
 
@@ -22,6 +24,25 @@ websocket_url = (
 )
 headers = ["Authorization: Bearer " + OPENAI_API_KEY, "OpenAI-Beta: realtime=v1"]
 
+# Tool execution settings: tools run on a bounded thread pool so a slow one
+# (e.g. a database query) never blocks the event loop relaying audio
+TOOL_MAX_WORKERS = int(os.getenv("REALTIME_TOOL_MAX_WORKERS", "8"))
+TOOL_DEFAULT_TIMEOUT = float(os.getenv("REALTIME_TOOL_TIMEOUT", "5"))
+TOOL_TIMEOUTS = {
+    "make_reservation": float(
+        os.getenv("REALTIME_TOOL_TIMEOUT_MAKE_RESERVATION", "10")
+    ),
+    "get_upcoming_reservation_availability": float(
+        os.getenv("REALTIME_TOOL_TIMEOUT_AVAILABILITY", "5")
+    ),
+    "get_popular_dishes": 2.0,
+    "get_dish_details": 2.0,
+}
+
+tool_executor = ThreadPoolExecutor(
+    max_workers=TOOL_MAX_WORKERS, thread_name_prefix="realtime-tool"
+)
+
 # Global Variables
 current_response_id = None
 ai_is_responding = False
@@ -81,49 +102,93 @@ def stop_audio():
             is_playing_audio = False
 
 
+def call_tool(function_name, arguments):
+    """Run a tool synchronously and return its result."""
+    if function_name == "make_reservation":
+        # Extract parameters from arguments
+        party_name = arguments.get("party_name")
+        date = arguments.get("date")
+        time = arguments.get("time")
+        party_size = arguments.get("party_size")
+        extra_notes = arguments.get("extra_notes")
+
+        # Call the function
+        return make_reservation(party_name, date, time, party_size, extra_notes)
+    elif function_name == "get_popular_dishes":
+        return get_popular_dishes()
+    elif function_name == "get_dish_details":
+        dish_id = arguments.get("dish_id")
+        return get_dish_details(dish_id)
+    elif function_name == "get_upcoming_reservation_availability":
+        return get_upcoming_reservation_availability()
+    else:
+        return {"success": False, "message": f"Unknown function: {function_name}"}
+
+
+def run_tool(function_name, arguments_str):
+    """Parse the arguments, run the tool and serialize its result for the model."""
+    try:
+        result = call_tool(function_name, json.loads(arguments_str))
+    except Exception as e:
+        print(f"Error handling function call: {e}")
+        result = {"success": False, "message": f"{function_name} failed: {e}"}
+
+    # Convert result to string if it's not already
+    if not isinstance(result, str):
+        result = json.dumps(result)
+    return result
+
+
+async def execute_tool(function_name, arguments_str):
+    """
+    Run a tool on the tool executor without blocking the event loop.
+
+    Each tool has its own timeout. When it expires, or the caller is
+    cancelled, a call still queued for a worker is dropped. One already
+    running keeps its thread until it returns, since threads can't be
+    interrupted. Either way, the model is told the tool failed. A timed-out
+    write may still commit, so tools that write must be idempotent:
+    make_reservation is, so a retry can't book twice.
+    """
+    timeout = TOOL_TIMEOUTS.get(function_name, TOOL_DEFAULT_TIMEOUT)
+    loop = asyncio.get_running_loop()
+    try:
+        return await asyncio.wait_for(
+            loop.run_in_executor(tool_executor, run_tool, function_name, arguments_str),
+            timeout,
+        )
+    except asyncio.TimeoutError:
+        print(f"Tool {function_name} timed out after {timeout}s")
+        return json.dumps(
+            {
+                "success": False,
+                "message": f"{function_name} timed out, please try again",
+            }
+        )
+
+
+_OUTPUT_EVENT_PREFIX = '{"type":"conversation.item.create","item":{"type":"function_call_output","call_id":'
+
+
+def function_call_output_message(call_id, result):
+    """
+    The function_call_output event for a tool result, as a text frame.
+
+    Catalog results carry their output pre-escaped, so they are spliced in as is.
+    """
+    output = getattr(result, "literal", None) or json.dumps(result)
+    return _OUTPUT_EVENT_PREFIX + json.dumps(call_id) + ',"output":' + output + "}}"
+
+
 async def handle_function_call(ws, function_name, arguments_str, call_id):
     """Process a function call from the LLM and return the result."""
     print("Inside Function Call Handler")
     try:
-        # Parse arguments
-        arguments = json.loads(arguments_str)
-
-        result = None
-        if function_name == "make_reservation":
-            # Extract parameters from arguments
-            party_name = arguments.get("party_name")
-            date = arguments.get("date")
-            time = arguments.get("time")
-            party_size = arguments.get("party_size")
-            extra_notes = arguments.get("extra_notes")
-
-            # Call the function
-            result = make_reservation(party_name, date, time, party_size, extra_notes)
-        elif function_name == "get_popular_dishes":
-            result = get_popular_dishes()
-        elif function_name == "get_dish_details":
-            dish_id = arguments.get("dish_id")
-            result = get_dish_details(dish_id)
-        elif function_name == "get_upcoming_reservation_availability":
-            result = get_upcoming_reservation_availability()
-        else:
-            result = {"success": False, "message": f"Unknown function: {function_name}"}
-
-        # Convert result to string if it's not already
-        if not isinstance(result, str):
-            result = json.dumps(result)
+        result = await execute_tool(function_name, arguments_str)
 
         # Send the function result back to the model
         print("Sending function result back to the model...")
-        event = {
-            "type": "conversation.item.create",
-            "item": {
-                "type": "function_call_output",
-                "call_id": call_id,
-                "output": result,
-            },
-        }
-        await ws.send(json.dumps(event))
+        await ws.send(function_call_output_message(call_id, result))
 
     except Exception as e:
         print(f"Error handling function call: {e}")
@@ -252,8 +317,10 @@ def on_message(ws, message):
         # Wait a moment for this to be processed
         threading.Event().wait(0.2)
 
-        # Now execute the function and send the output
-        handle_function_call(ws, function_name, arguments, call_id)
+        # Now execute the function and send the output. This client is synchronous
+        # and already on its own thread, so the tool runs inline here.
+        result = run_tool(function_name, arguments)
+        ws.send(function_call_output_message(call_id, result))
 
     elif event_type == "response.audio.delta":
         # Process and play audio chunk immediately
@@ -294,9 +361,11 @@ def main():
 # Function definitions for the LLM to call
 import datetime
 
-# Storage for reservations
-reservations = []
-
+from logic.realtime_api_openai.reservations_agent.catalog import get_catalog
+from logic.realtime_api_openai.reservations_agent.reservation_store import (
+    ReservationConflict,
+    add_reservation,
+)
 
 # Function definitions for the LLM to call
 function_definitions = [
@@ -360,126 +429,17 @@ function_definitions = [
 
 def get_popular_dishes():
     """Function to return popular dishes with their corresponding IDs."""
-    # This function could be expanded to fetch data from a database or an API
-    # For now, we'll return a static list of popular dishes
-    return [
-        {"id": 1, "name": "Spaghetti Carbonara"},
-        {"id": 2, "name": "Margherita Pizza"},
-        {"id": 3, "name": "Grilled Salmon"},
-        {"id": 4, "name": "Tiramisu"},
-    ]
+    # Served from the catalog data file, already serialized for the model
+    return get_catalog().popular_dishes
 
 
 def get_dish_details(dish_id):
-    # For every dish, return ingredients, calories, prices and generate 5 user reviews
-    # For now, store everything in a static list corresponding to the dishes available in get_popular_dishes
-    # This function could be expanded to fetch data from a database or an API
-    # For now, we'll return a static list of popular dishes
-    dishes = {
-        1: {
-            "name": "Spaghetti Carbonara",
-            "ingredients": [
-                "spaghetti",
-                "eggs",
-                "parmesan cheese",
-                "pancetta",
-                "black pepper",
-            ],
-            "calories": 600,
-            "price": 12.99,
-            "reviews": [
-                {"user": "Alice", "review": "Delicious and creamy!"},
-                {"user": "Bob", "review": "A bit too salty for my taste."},
-                {"user": "Charlie", "review": "Perfectly cooked pasta!"},
-                {"user": "David", "review": "My favorite dish here!"},
-                {"user": "Eve", "review": "Authentic Italian flavor."},
-            ],
-        },
-        # Add details for other dishes similarly
-        2: {
-            "name": "Margherita Pizza",
-            "ingredients": [
-                "pizza dough",
-                "tomato sauce",
-                "mozzarella cheese",
-                "basil",
-            ],
-            "calories": 800,
-            "price": 10.99,
-            "reviews": [
-                {"user": "Frank", "review": "Classic and simple, love it!"},
-                {"user": "Grace", "review": "The crust was a bit soggy."},
-                {"user": "Heidi", "review": "Fresh ingredients make a difference."},
-                {"user": "Ivan", "review": "Best pizza in town!"},
-                {"user": "Judy", "review": "A bit pricey for what you get."},
-            ],
-        },
-        3: {
-            "name": "Grilled Salmon",
-            "ingredients": ["salmon fillet", "olive oil", "lemon", "herbs"],
-            "calories": 450,
-            "price": 18.99,
-            "reviews": [
-                {"user": "Peggy", "review": "Cooked to perfection!"},
-                {"user": "Quentin", "review": "A bit dry for my taste."},
-                {"user": "Rupert", "review": "Flavors were amazing."},
-                {"user": "Sybil", "review": "Healthy and delicious."},
-                {"user": "Trent", "review": "I love the lemon zest."},
-            ],
-        },
-        4: {
-            "name": "Tiramisu",
-            "ingredients": [
-                "ladyfingers",
-                "mascarpone cheese",
-                "coffee",
-                "cocoa powder",
-            ],
-            "calories": 400,
-            "price": 6.99,
-            "reviews": [
-                {"user": "Uma", "review": "The best dessert ever!"},
-                {"user": "Victor", "review": "Too sweet for my liking."},
-                {"user": "Walter", "review": "Perfect end to a meal."},
-                {"user": "Xena", "review": "I could eat this all day."},
-                {"user": "Yara", "review": "Authentic Italian dessert."},
-            ],
-        },
-    }
-    # Return the details of the requested dish
-    dish_details = dishes.get(dish_id)
-    if dish_details:
-        return {
-            "name": dish_details["name"],
-            "ingredients": dish_details["ingredients"],
-            "calories": dish_details["calories"],
-            "price": dish_details["price"],
-            "reviews": dish_details["reviews"],
-        }
-    else:
-        return {"error": "Dish not found"}
+    # Ingredients, calories, price and user reviews for a dish from get_popular_dishes
+    return get_catalog().dish(dish_id)
 
 
 def get_upcoming_reservation_availability():
-    return {
-        "2025-05-15": True,
-        "2025-05-16": True,
-        "2025-05-17": False,
-        "2025-05-18": True,
-        "2025-05-19": True,
-        "2025-05-20": True,
-        "2025-05-21": True,
-        "2025-05-22": True,
-        "2025-05-23": True,
-        "2025-05-24": True,
-        "2025-05-25": True,
-        "2025-05-26": False,
-        "2025-05-27": True,
-        "2025-05-28": False,
-        "2025-05-29": True,
-        "2025-05-30": True,
-        "2025-05-31": False,
-    }
+    return get_catalog().availability
 
 
 def make_reservation(party_name, date, time, party_size, extra_notes=None):
@@ -497,7 +457,6 @@ def make_reservation(party_name, date, time, party_size, extra_notes=None):
 
     # Create reservation record
     reservation = {
-        "id": len(reservations) + 1,
         "name": party_name,
         "date": date,
         "time": time,
@@ -506,8 +465,11 @@ def make_reservation(party_name, date, time, party_size, extra_notes=None):
         "extra_notes": extra_notes,
     }
 
-    # Store the reservation
-    reservations.append(reservation)
+    # Store the reservation; the store assigns an id that is unique across workers
+    try:
+        reservation["id"] = add_reservation(reservation)
+    except ReservationConflict as e:
+        return {"success": False, "message": f"Not booked: {e}."}
     print(f"Reservation made: {reservation}")
     return {
         "success": True,
@@ -0,0 +1,186 @@
+"""
+Request coalescing: concurrent callers with the same key share one upstream call.
+"""
+
+import asyncio
+import threading
+from contextlib import aclosing
+
+
+class SingleFlightError(Exception):
+    """
+    Raised in each caller that waited on a coalesced call which failed.
+
+    Every waiter gets its own instance, so none share a traceback; the
+    original error is its __cause__ (and is raised as is in the first caller).
+    """
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Thread-safe coalescing for blocking calls.
+
+    The first caller for a key runs fn(); callers arriving while it is in
+    flight block until it finishes and receive the same result, or a
+    SingleFlightError caused by the same exception.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise SingleFlightError(
+                    f"Coalesced call failed: {call.error!r}"
+                ) from call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+
+class StreamFlightError(Exception):
+    """
+    Raised in each subscriber of a coalesced stream whose upstream failed.
+
+    Every subscriber gets its own instance; the upstream error is its __cause__.
+    """
+
+
+class _StreamFlight:
+    def __init__(self, max_ahead):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        # Chunks taken by the fastest subscriber; upstream is read at most
+        # max_ahead chunks ahead of it
+        self.consumed = 0
+        self.max_ahead = max_ahead
+        self.changed = asyncio.Condition()
+        self.task = None
+
+    def _wants_chunk(self):
+        return len(self.chunks) - self.consumed < self.max_ahead
+
+    async def pump(self, chunks):
+        try:
+            async with aclosing(chunks):
+                while True:
+                    async with self.changed:
+                        await self.changed.wait_for(self._wants_chunk)
+                    try:
+                        chunk = await anext(chunks)
+                    except StopAsyncIteration:
+                        break
+                    self.chunks.append(chunk)
+                    async with self.changed:
+                        self.changed.notify_all()
+        except asyncio.CancelledError:
+            self.error = ConnectionAbortedError("Upstream stream was cancelled")
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            async with self.changed:
+                self.changed.notify_all()
+
+    async def taken(self, count):
+        """
+        A subscriber has taken `count` chunks; lets the pump read further ahead
+        """
+        if count > self.consumed:
+            self.consumed = count
+            async with self.changed:
+                self.changed.notify_all()
+
+
+class StreamSingleFlight:
+    """
+    Coalescing for async chunk streams.
+
+    The first request for a key starts the upstream stream in a background
+    task; concurrent requests for the same key subscribe to it and each
+    receive the full chunk sequence from the start. Upstream is paced to the
+    fastest subscriber: the next chunk is only pulled once a subscriber has
+    taken the previous ones (up to max_ahead chunks early), so backpressure
+    from the clients still reaches the LLM. The upstream keeps running if the
+    first caller disconnects and is cancelled once every subscriber has gone.
+    """
+
+    def __init__(self, max_ahead=1):
+        self.max_ahead = max_ahead
+        self._flights = {}
+
+    async def stream(self, key, factory, on_join=None):
+        """
+        Chunks of the stream for key, started with factory() unless already in
+        flight; on_join() is called when this request joins one in flight
+        """
+        # Joining happens on the first iteration, so a response that is never
+        # started never holds a flight open
+        flight = self._flights.get(key)
+        if flight is not None:
+            if on_join is not None:
+                on_join()
+        else:
+            flight = self._flights[key] = _StreamFlight(self.max_ahead)
+            flight.task = asyncio.create_task(flight.pump(factory()))
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+        flight.subscribers += 1
+
+        index = 0
+        try:
+            while True:
+                if index < len(flight.chunks):
+                    yield flight.chunks[index]
+                    index += 1
+                    await flight.taken(index)
+                    continue
+                if flight.done:
+                    if flight.error is not None:
+                        raise StreamFlightError(
+                            f"Upstream stream failed: {flight.error!r}"
+                        ) from flight.error
+                    return
+                async with flight.changed:
+                    await flight.changed.wait_for(
+                        lambda: index < len(flight.chunks) or flight.done
+                    )
+        finally:
+            flight.subscribers -= 1
+            # Nobody is listening any more, stop paying for the upstream stream.
+            # Forget the flight right away so no new request joins it while
+            # the cancellation is still being delivered.
+            if flight.subscribers == 0 and not flight.done:
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    def _forget(self, key, flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
@@ -1,12 +1,35 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from apps.debugger_app.routes import router as debug_router
 from apps.flight_tracker.routes import router as flight_tracker_router
 from apps.sql_query_builder.routes import router as sql_query_builder_router
 from apps.langchain_stream.routes import router as langchain_stream_router
+from apps.langchain_stream.llm_client import lifespan as langchain_stream_lifespan
+from apps.langchain_stream.cache import lifespan as langchain_stream_cache_lifespan
+from apps.async_llm.routes import router as async_llm_router
+from apps.async_llm.results import lifespan as async_llm_lifespan
 from apps.twilio_restaurants.routes import router as twilio_restaurants_router
+from apps.twilio_restaurants.sessions import lifespan as twilio_restaurants_lifespan
+from apps.metrics.routes import router as metrics_router
+from apps.metrics.multiprocess import lifespan as metrics_lifespan
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # App-scoped resources (connection pools, clients) live for the worker's lifetime
+    async with (
+        langchain_stream_lifespan(app),
+        langchain_stream_cache_lifespan(app),
+        async_llm_lifespan(app),
+        twilio_restaurants_lifespan(app),
+        metrics_lifespan(app),
+    ):
+        yield
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -35,3 +58,5 @@ app.include_router(
     prefix="/langchain_stream_router",
     tags=["langchain_stream_router"],
 )
+app.include_router(async_llm_router, prefix="/async_llm", tags=["async_llm"])
+app.include_router(metrics_router, tags=["metrics"])